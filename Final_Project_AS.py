@@ -1,10 +1,13 @@
+import os
+from urllib.parse import urlencode, urlsplit
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
-import pydeck as pdk
-import plotly.express as px
-import os
-import seaborn as sns
+import nuclear_data as nd
+
+# The plotting libraries (matplotlib, seaborn, pydeck) are imported inside the views that draw with them.
+# Streamlit runs every tab on each run, so the first run of a session still imports all three (tab3, tab5
+# and tab7 draw charts); the deferral keeps them out of nuclear_data.py, the API and the benchmarks.
+# Check with: python benchmarks/import_time.py
 
 # Name: Askarbek Suleimenov
 # CS230: Section 4
@@ -20,30 +23,41 @@ import seaborn as sns
 # The application integrates visualizations such as maps, pie charts, and bar charts to make the data more engaging and insightful.
 # By combining filters and dynamic tools, the project offers an accessible way to investigate patterns and details behind nuclear detonations historically.
 
-data = "nuclear_explosions.csv"
-df = pd.read_csv(data)
-
-df.rename(columns = {"WEAPON SOURCE COUNTRY":"Source Country",           # Rename the columns for the better understanding and readability [DA1]
-                        "WEAPON DEPLOYMENT LOCATION":"Deployment Location",
-                       "Location.Cordinates.Latitude": "Latitude",
-                       "Location.Cordinates.Longitude":"Longitude",
-                       "Location.Cordinates.Depth":"Depth",
-                       "Data.Source":"Source",
-                       "Data.Magnitude.Body":"Body Wave Magnitude",
-                       "Data.Magnitude.Surface":"Surface Wave Magnitude",
-                       "Data.Yeild.Lower":"Explosion Yield L",
-                       "Data.Yeild.Upper":"Explosion Yield U",
-                       "Data.Purpose":"Detonation Reason",
-                       "Data.Name":"Name",
-                       "Data.Type":"Detonation Method",
-                       "Date.Day":"Day",
-                       "Date.Month":"Month",
-                       "Date.Year":"Year"}, inplace=True)
+df = nd.load_catalog()  # Renamed catalog with the estimated yields, cached per dataset version (see nuclear_data.py)
+
+
+API_URL = os.environ.get("NUCLEAR_API_URL", "").rstrip("/")  # Where api.py runs, e.g. http://localhost:8000
+
+
+def export_controls(frame, name, key, rows=None, api_query=None):
+    """Download widget for the rows of a tab.
+
+    frame can also be a function returning the rows, so they are only selected when the file is downloaded.
+    api_query is the API request returning the same rows (e.g. "years?start=1945&end=1960"): when
+    NUCLEAR_API_URL is set, the button links there and the API streams the file.
+    """
+    rows = len(frame) if rows is None else rows
+    with st.expander("⬇️ Download these rows"):
+        export_format = st.radio("File format", list(nd.EXPORT_FORMATS), horizontal=True, key=f"{key}_format")
+        extension, mime = nd.EXPORT_FORMATS[export_format]
+        label = f"Download {export_format} file ({rows} rows)"
+
+        if API_URL and api_query:
+            separator = "&" if "?" in api_query else "?"
+            st.link_button(label, f"{API_URL}/{api_query}{separator}format={extension}")
+            return
+
+        # Streamlit calls the function only when the button is clicked, so reruns never build the file,
+        # but it holds the whole file in memory and sends it only once it is complete.
+        st.download_button(label, data=lambda: nd.export_bytes(frame() if callable(frame) else frame, export_format),
+                           file_name=f"{name}.{extension}", mime=mime, key=f"{key}_download")
+        st.caption("The file is built in memory by the app. For large selections, run the API (api.py) and set "
+                   "NUCLEAR_API_URL: the download is then streamed as it is written.")
 
 st.title("All Nuclear Explosions Prior to 2000")
 
 #Making tabs based onb the information that I will provide with this site
-tab1, tab2, tab3 , tab4 , tab5, tab6 , tab7 = st.tabs(["Main Page","Data Dictionary", "Filter by Year", "Map", "Weapon Source", "Detonation Reasons", "Explosion Statistics"]) #[ST1]
+tab1, tab2, tab3 , tab4 , tab5, tab6 , tab7, tab8 = st.tabs(["Main Page","Data Dictionary", "Filter by Year", "Map", "Weapon Source", "Detonation Reasons", "Explosion Statistics", "Trends"]) #[ST1]
 
 with tab1:
     st.title("🌍 Nuclear Bomb Detonations Explorer") #[ST2]
@@ -76,6 +90,7 @@ with tab1:
         - **Weapon Source**: Analyze detonations by source countries.
         - **Detonation Reasons**: Explore the purposes behind the detonations.
         - **Explosion Statistics**: Gain insights into yields, counts, and patterns.
+        - **Trends**: Follow testing per country over time, and compare before and after the test ban treaties.
     """)
     st.markdown(" ")
     st.markdown("---")
@@ -89,6 +104,9 @@ with tab2:
         Below is the cleaned and formatted dataset showing all nuclear detonations before 2000. 
         Each column represents specific details about each detonation:
 
+        Values the original data uses as placeholders are shown as empty cells: yields and magnitudes of 0
+        (unknown), the reason "Nan" and coordinates outside the globe.
+
         - **Source**: Source that reported the explosion event.
         - **Source Country**: Country deploying the nuclear device.
         - **Deployment Location**: Region where the nuclear device was deployed.
@@ -107,12 +125,27 @@ with tab2:
         - **Day**: Day of detonation.
         - **Month**: Month of detonation.
         - **Year**: Year of detonation.
+        - **Date**: Date of detonation built from Day, Month and Year (empty when they do not form a valid date).
+        - **Estimated Yield**: Yield in kilotons estimated from the seismic magnitudes (fitted per test site).
+        - **Estimated Yield Low / High**: 95% uncertainty band of the estimated yield.
+        - **site_id**: Test site of the detonation (detonations within 25 km of each other share a site, -1 = no coordinates).
     """)
 
     # Dataframe widget [VIZ1] [ST1]
     st.subheader("Cleaned Dataset Preview")
     st.dataframe(df)
 
+    # Result of the validation done when the data was loaded
+    with st.expander("Data quality"):
+        st.dataframe(nd.quality_report(), hide_index=True)
+
+    # Which catalog files were merged into the dataset (set NUCLEAR_CATALOGS to load several)
+    with st.expander("Catalog files"):
+        load_report = nd.load_report()
+        st.dataframe(load_report, hide_index=True)
+        st.caption(f"Loaded {len(df)} detonations from {len(load_report)} file(s) "
+                   f"in {load_report.attrs['total_seconds']:.2f} s (dataset version {df.attrs['version']}).")
+
 with tab3:
     st.title("📊 Filter by Year")
 
@@ -121,16 +154,17 @@ with tab3:
     # Year range slider [ST2]
     min_year = int(df["Year"].min())
     max_year = int(df["Year"].max())
-    year_range = st.slider("Select Year Range:",min_year,max_year, (1945,1998), step=1)
+    year_range = st.slider("Select Year Range:",min_year,max_year, (1945,1998), step=1, key="year_range")
 
-    # [DA4] Filter data by one condition, based on the selected range
-    filtered_data = df[(df["Year"] >= year_range[0]) & (df["Year"] <= year_range[1])]
-    year_counts = filtered_data["Year"].value_counts().sort_index()
+    year_counts = nd.derive("year_counts", df).loc[year_range[0]:year_range[1]]  # Counted once, sliced per range
 
     # Check if there are empty data points (years with no detonated bombs)
     if year_counts.empty: #[PY4]
         st.warning("No data available for the selected range. Please adjust the slider.")
     else:
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         # Plot the bar chart using seaborn package - place that took me a lot of time
         fig, ax = plt.subplots(figsize=(10, 6)) # Initiates the chart
         sns.barplot(x=year_counts.index, y=year_counts.values, palette="viridis", ax=ax) # seaborn
@@ -150,6 +184,11 @@ with tab3:
         st.subheader("Data Summary")
         st.write(year_counts)
 
+    # [DA4] Filter data by one condition, based on the selected range; only done when the file is downloaded
+    export_controls(lambda: nd.filter_by_years(df, year_range[0], year_range[1]),
+                    f"detonations_{year_range[0]}_{year_range[1]}", key="year_export", rows=int(year_counts.sum()),
+                    api_query="years?" + urlencode({"start": year_range[0], "end": year_range[1]}))
+
 with tab4:
     st.title("🌍 Global Map of Nuclear Detonations")
 
@@ -159,13 +198,16 @@ with tab4:
         - **Simple Map**: Basic map showing detonation points.
         - **Scatterplot Map**: Layered map with denser points showing darker colors.
         - **Custom Tooltip Map**: Points with country flags shown on hover.
+        - **Density Map**: Density of detonations (or of their yield) drawn on the server as image tiles.
+        - **Test Sites Map**: One point per test site, sized by the number of detonations.
     """)
 
     # [ST2] Sidebar widget for map selection
-    selected_map = st.sidebar.radio("Please select the map", ["", "Simple", "Scatterplot", "Custom Tooltip"])
+    selected_map = st.sidebar.radio("Please select the map", ["", "Simple", "Scatterplot", "Custom Tooltip", "Density", "Test Sites"],
+                                    key="map_type")
 
-    map_data = df[["Latitude", "Longitude", "Source Country"]].dropna()  # Drop rows with missing values [DA1]
-    map_data.rename(columns={"Latitude": "lat", "Longitude": "lon"}, inplace=True)  # Rename columns for PyDeck compatibility [DA4]
+    map_data = nd.derive("map_points", df)  # Only the map columns, rows with missing values dropped [DA1]
+    map_data = map_data.rename(columns={"Latitude": "lat", "Longitude": "lon"})  # Rename columns for PyDeck compatibility [DA4]
 
     if selected_map == "Simple":
         st.title("🗺️ Simple Map")
@@ -173,6 +215,8 @@ with tab4:
         st.map(map_data)
 
     elif selected_map == "Scatterplot":
+        import pydeck as pdk
+
         st.title("📍 Scatterplot Map")
 
         view_state = pdk.ViewState(
@@ -216,6 +260,8 @@ with tab4:
         st.pydeck_chart(scatter_map)
 
     elif selected_map == "Custom Tooltip":
+        import pydeck as pdk
+
         st.title("🖼️ Custom Tooltip Map")
 
         view_state = pdk.ViewState(
@@ -239,12 +285,14 @@ with tab4:
 
         # Normalize the Source Country column and map to flag URLs
         # That's the problem that I had, and some flags didn't show up [DA1]
-        map_data["Source Country"] = map_data["Source Country"].str.strip().str.lower()  # [PY1]
-        map_data["Flag"] = map_data["Source Country"].map(flag_urls)  # Map flags to countries [DA4]
+        # New columns go into a separate frame, so map_data stays as the other views expect it
+        countries = map_data["Source Country"].astype(str).str.strip().str.lower()  # [PY1]
+        flag_data = map_data.assign(**{"Source Country": countries,
+                                       "Flag": countries.map(flag_urls)})  # Map flags to countries [DA4]
 
         icon_layer = pdk.Layer(
             type="ScatterplotLayer",
-            data=map_data,
+            data=flag_data,
             get_position='[lon, lat]',
             get_radius=20000,
             get_color=[0, 100, 255, 180],  # Blue color
@@ -270,6 +318,74 @@ with tab4:
 
         st.pydeck_chart(tooltip_map)
 
+    elif selected_map == "Density":
+        import pydeck as pdk
+        import density_tiles
+
+        st.title("🔥 Density Map")
+        st.caption("Rendered on the server as small image tiles, so the map stays light however many detonations there are.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            density_metric = st.radio("Density of", ["Detonations", "Yield"], horizontal=True, key="density_metric")
+        with col2:
+            density_zoom = st.select_slider("Detail level", options=list(range(density_tiles.MAX_ZOOM + 1)), value=2,
+                                            key="density_zoom")
+
+        # Tiles are cached on disk per dataset version, so this only renders the first time
+        tiles = density_tiles.render_tiles(df, "count" if density_metric == "Detonations" else "yield", density_zoom)
+
+        # The browser fetches the tiles from this server: the address the page was opened with, else localhost
+        page = urlsplit(getattr(st.context, "url", None) or "")
+        if page.scheme in ("http", "https"):
+            server_root = f"{page.scheme}://{page.netloc}/{st.get_option('server.baseUrlPath').strip('/')}"
+        else:
+            server_root = f"http://localhost:{st.get_option('server.port')}/"
+        tiles = density_tiles.tile_urls(tiles, server_root)
+        tile_layers = [
+            pdk.Layer(type="BitmapLayer", id=f"tile-{tile['x']}-{tile['y']}", image=tile["url"], bounds=tile["bounds"])
+            for tile in tiles
+        ]
+
+        density_map = pdk.Deck(
+            map_style="mapbox://styles/mapbox/dark-v11",
+            initial_view_state=pdk.ViewState(latitude=20, longitude=0, zoom=density_zoom, pitch=0),
+            layers=tile_layers
+        )
+        st.pydeck_chart(density_map)
+
+    elif selected_map == "Test Sites":
+        import pydeck as pdk
+
+        st.title("🎯 Test Sites Map")
+
+        sites = nd.derive("site_summary", df)  # Clustered once per dataset version
+        st.metric("Test Sites", len(sites))
+        sites = sites.assign(radius=(sites["Detonations"] ** 0.5) * 20000,  # Area grows with the count
+                             **{"Site": sites["Site"].astype(str), "Dominant Country": sites["Dominant Country"].astype(str)})
+
+        site_layer = pdk.Layer(
+            type="ScatterplotLayer",
+            data=sites,
+            get_position="[Longitude, Latitude]",
+            get_radius="radius",
+            get_color=[255, 140, 0, 170],
+            pickable=True
+        )
+
+        site_map = pdk.Deck(
+            map_style="mapbox://styles/mapbox/light-v11",
+            initial_view_state=pdk.ViewState(latitude=sites["Latitude"].mean(), longitude=sites["Longitude"].mean(),
+                                             zoom=1, pitch=0),
+            layers=[site_layer],
+            tooltip={
+                "html": "<b>{Site}</b> ({Dominant Country})<br>{Detonations} detonations, {First Year} - {Last Year}",
+                "style": {"backgroundColor": "black", "color": "white"}
+            }
+        )
+        st.pydeck_chart(site_map)
+        st.dataframe(sites.drop(columns="radius"), hide_index=True)
+
 with tab5:
     st.title("🔎 Weapon Source Analysis")
 
@@ -280,23 +396,10 @@ with tab5:
         - Smaller contributors (China, India, Pakistan, and UK) are combined into "Other Countries".
     """)
 
-    # [DA2] Group data by Source Country and count occurrences, to count total detonations
-    detonations_by_country = map_data.groupby("Source Country").size().reset_index(name="Detonation Count")
+    # [DA2] [DA3] [DA7] [DA9] Count detonations per country, smaller contributors grouped into "Other Countries"
+    detonations_by_country = nd.derive("country_shares", df)  # Independent of the map options in tab4
 
-    # [DA7] Normalize country names for consistent matching
-    detonations_by_country["Source Country"] = detonations_by_country["Source Country"].str.strip().str.lower()
-
-    # [DA9] Use a lambda function to combine smaller contributors into "Other Countries"
-    other_countries = ["china", "india", "pakist", "uk"]
-    detonations_by_country["Source Country"] = detonations_by_country["Source Country"].apply(
-        lambda x: "Other Countries" if x in other_countries else x
-    ) # [DA1] Updates the "Source Country" column so that smaller contributors are grouped together
-
-    # Regroup to merge "Other Countries" counts
-    detonations_by_country = detonations_by_country.groupby("Source Country", as_index=False).sum()
-
-    # [DA3] Sort the results by Detonation Count in descending order
-    detonations_by_country = detonations_by_country.sort_values(by="Detonation Count", ascending=False)
+    import matplotlib.pyplot as plt
 
     # Create a pie chart
     fig, ax = plt.subplots()
@@ -346,34 +449,31 @@ with tab6:
         Use the interactive filters below to explore the data based on detonation reasons.
     """)
 
-    # Count occurrences of each detonation reason
-    detonation_counts = df.groupby("Detonation Reason").size().reset_index(name="Count")
-    detonation_counts = detonation_counts.sort_values(by="Count", ascending=False)
-
     # Filter out single-digit reasons and keep top reasons, including "Combat", even though it's not a top reason
-    filtered_reasons = detonation_counts[detonation_counts["Count"] >= 10]  # Threshold for significance, can be any number, but I did 10
-    significant_reasons = filtered_reasons["Detonation Reason"].tolist()
-    if "Combat" not in significant_reasons:
-        significant_reasons.append("Combat")  # Ensure "Combat" is there
+    significant_reasons = list(nd.derive("significant_reasons", df))  # Threshold for significance is 10 detonations
 
     # [ST3] Multiselect widget for user interaction
     selected_reasons = st.multiselect(
         "Select Detonation Reasons to Filter:",
         options=significant_reasons,
-        default=significant_reasons  # Default to showing all significant reasons
+        default=significant_reasons,  # Default to showing all significant reasons
+        key="reasons"
     )
 
     # [DA5] Filter data by multiple conditions using .isin()
-    filtered_data = df[df["Detonation Reason"].isin(selected_reasons)].dropna(subset=["Detonation Reason"])  # Clean NaN rows
+    filtered_data = nd.filter_by_reasons(df, selected_reasons)
 
     # Group Data by Detonation Reason and Count Occurrences
-    reasons_summary = filtered_data.groupby("Detonation Reason").size().reset_index(name="Count")
-    reasons_summary = reasons_summary.sort_values(by="Count", ascending=False)
+    reasons_summary = nd.summarize_reasons(df, selected_reasons)
 
     # [VIZ3] Display filtered data as a table
     st.markdown("### Filtered Detonation Data")
     st.dataframe(filtered_data)
 
+    export_controls(filtered_data, "detonations_by_reason", key="reason_export",
+                    api_query=("reasons?" + urlencode([("reason", reason) for reason in selected_reasons]))
+                    if selected_reasons else None)  # The API reads no reason as the default selection
+
     st.markdown("### Detonation Reason Summary")
     st.table(reasons_summary)
 
@@ -397,31 +497,54 @@ with tab7:
         min_value=int(df["Explosion Yield L"].min()),
         max_value=int(df["Explosion Yield L"].max()),
         value=1000,
-        step=10
+        step=10,
+        key="yield_threshold"
     )
 
-    # [DA8] Identify high-yield detonations using iterrows
-    high_yield_rows = []
-    for _, row in df.iterrows():
-        if row["Explosion Yield L"] > yield_threshold:
-            high_yield_rows.append(row)
+    # Detonations without a reported yield can use the magnitude-based estimate instead
+    use_estimates = st.checkbox("Use estimated yields for detonations without a reported yield", value=False,
+                                key="use_estimates")
+
+    # Low thresholds select most of the catalog, so the table and the map are capped
+    col1, col2 = st.columns(2)
+    with col1:
+        top_k = st.number_input("Rows in the table (largest yields first)", min_value=10, max_value=len(df),
+                                value=min(500, len(df)), step=50, key="top_k")
+    with col2:
+        map_limit = st.number_input("Points on the map", min_value=10, max_value=len(df),
+                                     value=min(1000, len(df)), step=100, key="map_limit")
 
-    # Create a DataFrame for high-yield detonations
-    high_yield_df = pd.DataFrame(high_yield_rows)
+    # Identify high-yield detonations: the top K from the yield order precomputed once per dataset version
+    high_yield_df, high_yield_count = nd.top_yields(df, yield_threshold, int(top_k), use_estimates=use_estimates)
 
     # Display high-yield detonations DataFrame
     st.markdown(f"### Detonations with Yield Above {yield_threshold} Kilotons")
     if not high_yield_df.empty:
+        if high_yield_count > len(high_yield_df):
+            st.caption(f"Showing the {len(high_yield_df)} largest of {high_yield_count} detonations above the threshold.")
+        else:
+            st.caption(f"{high_yield_count} detonations above the threshold.")
         st.dataframe(high_yield_df)
+        # The download has every detonation above the threshold, not only the rows shown
+        export_controls(lambda: nd.high_yield(df, yield_threshold, use_estimates=use_estimates),
+                        f"detonations_above_{yield_threshold}kt", key="yield_export", rows=high_yield_count,
+                        api_query="high-yield?" + urlencode({"threshold": yield_threshold,
+                                                             "estimates": int(use_estimates)}))
     else:
         st.info("No detonations found with yields above the specified threshold.")
 
-    # Scatterplot Map for high-yield Detonations
+    # Scatterplot Map for high-yield Detonations, sampled per country when there are too many points
     st.markdown("### Scatterplot Map of High-Yield Detonations")
-    scatter_data = high_yield_df[["Latitude", "Longitude", "Explosion Yield L"]].dropna()
-    scatter_data.rename(columns={"Latitude": "lat", "Longitude": "lon"}, inplace=True)
+    map_rows, located_count = nd.sample_yields(df, yield_threshold, int(map_limit), use_estimates=use_estimates)
+    if len(map_rows) < located_count:
+        st.caption(f"The map shows a sample of {len(map_rows)} of the {located_count} located detonations, "
+                   "drawn from every source country.")
+    scatter_data = nd.project(map_rows, "yield_map")  # Only detonations with coordinates were sampled
+    scatter_data = scatter_data.rename(columns={"Latitude": "lat", "Longitude": "lon"})
 
     if not scatter_data.empty:
+        import pydeck as pdk
+
         view_state = pdk.ViewState(
             latitude=scatter_data["lat"].mean(),
             longitude=scatter_data["lon"].mean(),
@@ -430,7 +553,7 @@ with tab7:
         )
 
         # Adjust the radius dynamically based on the yield and scale
-        scatter_data["scaled_radius"] = scatter_data["Explosion Yield L"] / 10  # Scale for better visibility, can be edited
+        scatter_data["scaled_radius"] = scatter_data["Yield Used"] / 10  # Scale for better visibility, can be edited
 
         scatter_layer = pdk.Layer(
             type="ScatterplotLayer",
@@ -447,7 +570,7 @@ with tab7:
             initial_view_state=view_state,
             layers=[scatter_layer],
             tooltip={
-                "html": "<b>Explosion Yield:</b> {Explosion Yield L} kilotons",
+                "html": "<b>Explosion Yield:</b> {Yield Used} kilotons",
                 "style": {"backgroundColor": "steelblue", "color": "white"}
             }
         )
@@ -460,28 +583,60 @@ with tab7:
         - Use the slider above to adjust the explosion yield threshold and explore high-yield detonations.
         - The scatterplot map dynamically updates to reflect detonations exceeding the selected threshold.
         - Point size scales with the explosion yield for better visibility.
+        - Estimated yields come from a magnitude-yield fit per test site, so treat them as approximate.
     """)
 
 
+with tab8:
+    st.title("📉 Testing Trends")
 
+    st.markdown("""
+        This section follows nuclear testing of every source country over time: smoothed yearly activity,
+        the cumulative number of tests (or total yield), and how testing changed around the test ban treaties.
+    """)
 
+    # Years x countries matrices, built once per dataset version
+    matrix = nd.derive("year_country_matrix", df)
 
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        trend_metric = st.radio("Measure", ["Detonations", "Yield (kt)"], horizontal=True, key="trend_metric")
+    with col2:
+        trend_view = st.radio("Curve", ["Rolling average", "Cumulative"], horizontal=True, key="trend_view")
+    with col3:
+        trend_window = st.select_slider("Window (years)", options=[1, 3, 5, 10], value=5, key="trend_window",
+                                        disabled=trend_view == "Cumulative")
+
+    values = matrix.counts if trend_metric == "Detonations" else matrix.yields
+    if trend_view == "Cumulative":
+        curves = values.cumsum(axis=0)
+        st.markdown(f"### Cumulative {trend_metric.lower()} per source country")
+    else:
+        curves = nd.rolling_mean(values, trend_window)
+        st.markdown(f"### {trend_metric} per year, averaged over the last {trend_window} year(s)")
 
+    # Line chart with one line per country
+    st.line_chart(pd.DataFrame(curves, index=matrix.years, columns=matrix.countries))
 
+    st.markdown("### Before and After the Test Ban Treaties")
+    treaty_window = st.slider("Years compared on each side of the treaty", 1, 15, 5, key="treaty_window")
+    comparison = nd.treaty_comparison(matrix, treaty_window)
+    st.dataframe(comparison[comparison["Metric"] == trend_metric].drop(columns="Metric"), hide_index=True)
 
+    st.markdown("""
+        **Key Insights:**
+        - The Partial Test Ban Treaty (1963) banned tests in the atmosphere, in space and under water.
+        - The Comprehensive Nuclear-Test-Ban Treaty (1996) was signed to ban all nuclear tests.
+        - Yield totals only include detonations with a reported yield.
+    """)
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+# Memory report of the catalog and of the frames derived in this run
+with st.sidebar.expander("Memory report"):
+    memory = nd.memory_report(df, {"Year counts (tab3)": year_counts, "Map points (tab4)": map_data,
+                                   "Reason filter (tab6)": filtered_data, "High-yield rows (tab7)": high_yield_df})
+    st.metric("Catalog size", f"{memory.loc[memory['Frame'] == 'catalog', 'Bytes'].sum() / 1024:,.0f} KB")
+    peak_rss = nd.peak_rss_bytes()
+    if peak_rss is not None:
+        st.metric("Peak memory of the server process", f"{peak_rss / 1024 ** 2:,.0f} MB")
+    st.dataframe(memory, hide_index=True)
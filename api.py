@@ -0,0 +1,257 @@
+"""Read-only HTTP/JSON API for the aggregates of the Nuclear Explosions explorer.
+
+A plain ASGI application (no web framework needed) built on nuclear_data.py, so it serves exactly
+what the Streamlit tabs show. Run it with any ASGI server, for example:
+
+    uvicorn api:app --port 8000
+
+Endpoints (GET or HEAD):
+
+- /version                          dataset version
+- /years?start=1945&end=1998        detonations per year (tab3)
+- /countries                        detonations and share per source country (tab5)
+- /reasons?reason=Wr&reason=Pne     detonations per reason, significant reasons by default (tab6)
+- /high-yield?threshold=1000        detonations above a yield threshold (tab7), add estimates=1 to use
+                                    estimated yields, limit=K for only the K largest
+
+format=csv|parquet|geojson on /years, /reasons and /high-yield streams the selected detonations (the rows
+behind the tab, not the aggregate) as a file, written and sent chunk by chunk; the app's download buttons
+link here when NUCLEAR_API_URL is set.
+- /quality                          data-quality report made when the dataset was loaded
+
+Tables come back as JSON records, or as an Arrow IPC stream when the request sends
+"Accept: application/vnd.apache.arrow.stream". Responses are gzip-compressed when the client accepts it,
+and carry an ETag tied to the dataset version, so "If-None-Match" requests get a cheap 304.
+"""
+
+import asyncio
+import gzip
+import json
+import zlib
+from urllib.parse import parse_qs
+
+import nuclear_data as nd
+
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+JSON_TYPE = "application/json"
+MIN_GZIP_BYTES = 1024  # Smaller bodies are not worth compressing
+
+
+class BadRequest(Exception):
+    """Invalid query parameter, answered with a 400."""
+
+
+# Integer query parameters of every route, with their smallest allowed value
+INT_PARAMS = {"start": None, "end": None, "threshold": None, "limit": 0}
+
+
+def _int_param(params, name, default):
+    try:
+        value = int(params.get(name, [default])[0])
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    minimum = INT_PARAMS.get(name)
+    if minimum is not None and value < minimum:
+        raise BadRequest(f"{name} must be {minimum} or more")
+    return value
+
+
+def _check_params(path, params):
+    """Reject an invalid query before anything else, so that it never gets a 304."""
+    for name in INT_PARAMS.keys() & params.keys():
+        _int_param(params, name, None)
+    file_format = params.get("format", [None])[0]
+    extensions = [extension for extension, _ in nd.EXPORT_FORMATS.values()]
+    if file_format is not None and (path not in STREAMABLE or file_format not in extensions):
+        raise BadRequest(f"format={file_format} is not available for {path}")
+
+
+def _year_range(catalog, params):
+    return (_int_param(params, "start", int(catalog["Year"].min())),
+            _int_param(params, "end", int(catalog["Year"].max())))
+
+
+def _years(catalog, params):
+    start, end = _year_range(catalog, params)
+    counts = nd.derive("year_counts", catalog).loc[start:end]
+    return counts.rename_axis("Year").reset_index(name="Count")
+
+
+def _year_rows(catalog, params):
+    return nd.filter_by_years(catalog, *_year_range(catalog, params))
+
+
+def _countries(catalog, params):
+    return nd.derive("country_shares", catalog)
+
+
+def _selected_reasons(catalog, params):
+    return params.get("reason") or nd.derive("significant_reasons", catalog)
+
+
+def _reasons(catalog, params):
+    return nd.summarize_reasons(catalog, _selected_reasons(catalog, params))
+
+
+def _reason_rows(catalog, params):
+    return nd.filter_by_reasons(catalog, _selected_reasons(catalog, params))
+
+
+def _high_yield(catalog, params):
+    threshold = _int_param(params, "threshold", 1000)
+    use_estimates = params.get("estimates", ["0"])[0].lower() in ("1", "true", "yes")
+    if "limit" in params:
+        return nd.top_yields(catalog, threshold, _int_param(params, "limit", 0), use_estimates=use_estimates)[0]
+    return nd.high_yield(catalog, threshold, use_estimates=use_estimates)
+
+
+def _quality(catalog, params):
+    return nd.quality_report()
+
+
+ROUTES = {"/years": _years, "/countries": _countries, "/reasons": _reasons, "/high-yield": _high_yield,
+          "/quality": _quality}
+# Routes that also accept format=csv|parquet|geojson, with the function selecting the rows to stream
+STREAMABLE = {"/years": _year_rows, "/reasons": _reason_rows, "/high-yield": _high_yield}
+
+
+def _headers(scope):
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+
+
+def _accepts_gzip(headers):
+    return "gzip" in headers.get("accept-encoding", "")
+
+
+def _to_arrow(frame):
+    import pyarrow as pa  # Only needed when a client asks for Arrow
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _encode(frame, content_type):
+    if content_type == ARROW_TYPE:
+        return _to_arrow(frame)
+    return frame.to_json(orient="records", date_format="iso").encode("utf-8")  # NaN becomes null
+
+
+def _iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _send_body(send, status, headers, body):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    headers = [(b"content-type", JSON_TYPE.encode()), (b"content-length", str(len(body)).encode())]
+    await _send_body(send, status, headers + list(extra_headers), body)
+
+
+async def _stream(send, headers, chunks, head_only):
+    """Send the chunks as they are produced (chunked transfer), encoding them in a worker thread."""
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    if head_only:
+        await send({"type": "http.response.body", "body": b""})
+        return
+    iterator = iter(chunks)
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, done)
+        if chunk is done:
+            break
+        if chunk:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await asyncio.to_thread(nd.load_catalog)  # Warm the cache before the first request
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    path = scope["path"].rstrip("/") or "/"
+    if scope["method"] not in ("GET", "HEAD"):
+        await _send_json(send, 405, {"error": "read-only API, use GET"}, [(b"allow", b"GET, HEAD")])
+        return
+    if path != "/version" and path not in ROUTES:
+        await _send_json(send, 404, {"error": f"unknown endpoint {path}", "endpoints": ["/version", *ROUTES]})
+        return
+
+    headers = _headers(scope)
+    params = parse_qs(scope["query_string"].decode("latin-1"))
+    head_only = scope["method"] == "HEAD"
+    try:
+        _check_params(path, params)
+    except BadRequest as error:
+        await _send_json(send, 400, {"error": str(error)})
+        return
+    version = await asyncio.to_thread(nd.dataset_version)
+
+    # The answer only depends on the dataset version and the URL, so the version is a valid (weak) ETag
+    etag = f'W/"{version}"'
+    cache_headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache"),
+                     (b"vary", b"accept, accept-encoding"), (b"x-dataset-version", version.encode())]
+    if etag in [tag.strip() for tag in headers.get("if-none-match", "").split(",")]:
+        await _send_body(send, 304, cache_headers, b"")
+        return
+
+    if path == "/version":
+        await _send_json(send, 200, {"version": version}, cache_headers)
+        return
+
+    file_format = params.get("format", [None])[0]
+    try:
+        catalog = await asyncio.to_thread(nd.load_catalog)
+        handler = ROUTES[path] if file_format is None else STREAMABLE[path]
+        frame = await asyncio.to_thread(handler, catalog, params)
+    except BadRequest as error:
+        await _send_json(send, 400, {"error": str(error)})
+        return
+
+    if file_format is not None:
+        name = next(name for name, (extension, _) in nd.EXPORT_FORMATS.items() if extension == file_format)
+        response_headers = cache_headers + [
+            (b"content-type", nd.EXPORT_FORMATS[name][1].encode()),
+            (b"content-disposition", f'attachment; filename="{path.strip("/")}.{file_format}"'.encode())]
+        chunks = nd.EXPORT_WRITERS[name](frame)
+        if _accepts_gzip(headers):
+            response_headers.append((b"content-encoding", b"gzip"))
+            chunks = _iter_gzip(chunks)
+        await _stream(send, response_headers, chunks, head_only)
+        return
+
+    content_type = ARROW_TYPE if ARROW_TYPE in headers.get("accept", "") else JSON_TYPE
+    body = await asyncio.to_thread(_encode, frame, content_type)
+    response_headers = cache_headers + [(b"content-type", content_type.encode())]
+    if _accepts_gzip(headers) and len(body) >= MIN_GZIP_BYTES:
+        body = await asyncio.to_thread(gzip.compress, body, 6)
+        response_headers.append((b"content-encoding", b"gzip"))
+    response_headers.append((b"content-length", str(len(body)).encode()))
+    await _send_body(send, 200, response_headers, b"" if head_only else body)
+
+
+if __name__ == "__main__":
+    import uvicorn  # Any ASGI server works, uvicorn is just the common one
+
+    uvicorn.run(app, port=8000)
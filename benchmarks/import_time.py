@@ -0,0 +1,86 @@
+"""Startup import-time benchmark.
+
+Runs each import in a fresh interpreter with ``python -X importtime`` and reports the median of a few runs.
+The "startup" entry is the top of the app script (Streamlit + the data layer), which is also what the API
+and the data layer pay. The plotting libraries are imported by the views that draw charts; since Streamlit
+runs every tab, the first run of the app pays for them too, reported as "first run".
+
+    python benchmarks/import_time.py            # report, exit code 1 when startup is over budget
+    python benchmarks/import_time.py --repeat 5 --budget-ms 1500
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports done by Final_Project_AS.py at the top of the script
+STARTUP = "import os, urllib.parse, streamlit, nuclear_data"
+
+# Imports deferred to the views that need them
+DEFERRED = {
+    "matplotlib.pyplot": "import matplotlib.pyplot",
+    "seaborn": "import seaborn",
+    "pydeck": "import pydeck",
+}
+
+# First run of the app: the tabs drawing charts import every plotting library
+FIRST_RUN = "; ".join([STARTUP, *DEFERRED.values()])
+
+STARTUP_BUDGET_MS = 1500  # Budget for the startup imports (median, milliseconds)
+
+
+def import_times(statement):
+    """Run the statement with -X importtime; return (total ms, {top-level module: cumulative ms})."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):  # Only top-level imports
+            modules[name.strip()] = int(cumulative) / 1000
+    return sum(modules.values()), modules
+
+
+def measure(statement, repeat):
+    """Median total import time over repeat fresh interpreters, plus the slowest modules of the last run."""
+    totals = []
+    modules = {}
+    for _ in range(repeat):
+        total, modules = import_times(statement)
+        totals.append(total)
+    slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:5]
+    return statistics.median(totals), slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="startup import budget")
+    args = parser.parse_args()
+
+    startup_ms, slowest = measure(STARTUP, args.repeat)
+    print(f"startup: {startup_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, ms in slowest:
+        print(f"    {name:<30} {ms:8.1f} ms")
+
+    for name, statement in DEFERRED.items():
+        deferred_ms, _ = measure(statement, args.repeat)
+        print(f"deferred {name:<21} {deferred_ms:8.1f} ms")
+
+    first_run_ms, _ = measure(FIRST_RUN, args.repeat)
+    print(f"first run: {first_run_ms:6.1f} ms (startup + every plotting library)")
+
+    if startup_ms > args.budget_ms:
+        print("startup import time is over budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Load test: simulated Streamlit sessions driving the app headlessly.
+
+Every simulated user is a streamlit.testing AppTest session of Final_Project_AS.py that replays an
+interaction scenario (moving the year slider, switching maps, zooming the density map, changing reasons, sweeping the yield
+threshold...). Sessions of a scenario run concurrently in threads of one fresh process, like the sessions
+of one Streamlit server, and the report gives the rerun latency percentiles, the throughput and the peak
+memory of that process.
+
+    python benchmarks/load_test.py                          # every scenario, 4 concurrent sessions
+    python benchmarks/load_test.py --concurrency 16 --scenario yield_sweep --repeat 3
+"""
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "Final_Project_AS.py")
+sys.path.insert(0, ROOT)
+
+import nuclear_data as nd  # noqa: E402  (after the path setup)
+
+RERUN_TIMEOUT = 120  # Seconds a single rerun may take before the session fails
+
+
+# Scenarios: a list of steps, each step changes one widget and reruns the script
+
+def _yield_range():
+    catalog = nd.load_catalog()
+    return int(catalog["Explosion Yield L"].min()), int(catalog["Explosion Yield L"].max())
+
+
+def scenario_steps(name):
+    """(description, function applying the interaction to an AppTest) for every step of a scenario."""
+    low, high = _yield_range()
+    reasons = list(nd.derive("significant_reasons", nd.load_catalog()))
+    scenarios = {
+        "open": [],  # Only the first run of the script
+        "year_slider": [("year_range", lambda at, value=value: at.slider(key="year_range").set_value(value))
+                        for value in [(1945, 1960), (1960, 1975), (1975, 1998), (1950, 1990), (1945, 1998)]],
+        "maps": [("map_type", lambda at, value=value: at.radio(key="map_type").set_value(value))
+                 for value in ["Simple", "Scatterplot", "Custom Tooltip", "Density", "Test Sites", ""]],
+        "density": [("map_type", lambda at: at.radio(key="map_type").set_value("Density"))]
+                   + [("density_zoom", lambda at, value=value: at.select_slider(key="density_zoom").set_value(value))
+                      for value in [0, 1, 3]]
+                   + [("density_metric", lambda at: at.radio(key="density_metric").set_value("Yield")),
+                      ("density_zoom", lambda at: at.select_slider(key="density_zoom").set_value(2))],
+        "reasons": [("reasons", lambda at, value=value: at.multiselect(key="reasons").set_value(value))
+                    for value in [reasons[:1], reasons[:3], reasons[1:], [], reasons]],
+        "yield_sweep": [("yield_threshold", lambda at, value=value: at.slider(key="yield_threshold").set_value(value))
+                        for value in [high, 10000, 1000, 100, 10, low]]
+                       + [("use_estimates", lambda at: at.checkbox(key="use_estimates").check()),
+                          ("top_k", lambda at: at.number_input(key="top_k").set_value(100)),
+                          ("map_limit", lambda at: at.number_input(key="map_limit").set_value(200))],
+    }
+    scenarios["mixed"] = [step for steps in zip(scenarios["year_slider"], scenarios["maps"], scenarios["reasons"],
+                                                 scenarios["yield_sweep"]) for step in steps]
+    return scenarios[name]
+
+
+SCENARIOS = ["open", "year_slider", "maps", "density", "reasons", "yield_sweep", "mixed"]
+
+
+def run_session(scenario, repeat):
+    """Replay a scenario in one new session; returns the latency (seconds) of every rerun and the errors."""
+    from streamlit.testing.v1 import AppTest
+
+    latencies = []
+    errors = []
+    at = AppTest.from_file(APP, default_timeout=RERUN_TIMEOUT)
+
+    start = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - start)
+    errors.extend(str(exception.value) for exception in at.exception)
+
+    for _ in range(repeat):
+        for _, interact in scenario_steps(scenario):
+            interact(at)
+            start = time.perf_counter()
+            at.run()
+            latencies.append(time.perf_counter() - start)
+            errors.extend(str(exception.value) for exception in at.exception)
+    return latencies, errors
+
+
+def run_scenario(scenario, concurrency, repeat):
+    """Run concurrent sessions of a scenario in this process; returns the statistics as a dict."""
+    os.chdir(ROOT)  # The app opens bomb.png relative to its folder
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        sessions = list(pool.map(run_session, [scenario] * concurrency, [repeat] * concurrency))
+    wall = time.perf_counter() - start
+
+    latencies = np.array([latency for session_latencies, _ in sessions for latency in session_latencies]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"scenario": scenario, "reruns": len(latencies), "errors": sum(len(errors) for _, errors in sessions),
+            "p50": p50, "p95": p95, "p99": p99, "throughput": len(latencies) / wall,
+            "peak_rss": nd.peak_rss_bytes()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="simulated sessions running at the same time")
+    parser.add_argument("--repeat", type=int, default=1, help="times every session replays its scenario")
+    parser.add_argument("--scenario", choices=SCENARIOS, action="append", help="scenario to run (default: all)")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<12} {'reruns':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'reruns/s':>8} {'peak MB':>8}")
+    failed = False
+    for scenario in args.scenario or SCENARIOS:
+        # A fresh process per scenario, so the peak memory belongs to that scenario only
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            result = pool.submit(run_scenario, scenario, args.concurrency, args.repeat).result()
+        peak = f"{result['peak_rss'] / 1024 ** 2:8.0f}" if result["peak_rss"] is not None else f"{'n/a':>8}"
+        print(f"{result['scenario']:<12} {result['reruns']:>6} {result['errors']:>6} {result['p50']:8.0f} "
+              f"{result['p95']:8.0f} {result['p99']:8.0f} {result['throughput']:8.2f} {peak}")
+        failed = failed or result["errors"] > 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
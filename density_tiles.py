@@ -0,0 +1,136 @@
+"""Server-side density tiles for the map tab.
+
+Detonations are binned into a web-mercator pixel grid with NumPy (one np.bincount per zoom level, the same
+idea as datashader), coloured, and cut into 256x256 tiles saved as PNG or WebP under static/tiles/.
+Streamlit serves that folder (server.enableStaticServing in .streamlit/config.toml), so the browser only
+downloads small images, whatever the number of events.
+
+Tiles are cached on disk per dataset version, metric and zoom level; an index.json written after the
+tiles marks a complete level, so a level is rendered once and then only read back.
+"""
+
+import json
+import os
+import threading
+from urllib.parse import urljoin
+
+import numpy as np
+
+import nuclear_data as nd
+
+TILE_SIZE = 256
+MAX_ZOOM = 3  # Zoom 3 is a 2048x2048 pixel world, enough for a global catalog
+MAX_LATITUDE = 85.05112878  # Web-mercator limit
+TILE_FORMAT = "png"  # "png" or "webp"
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+TILE_DIR = os.path.join(STATIC_DIR, "tiles")
+TILE_URL = "app/static/tiles"  # Where Streamlit serves TILE_DIR, relative to the server root
+
+# Metric name -> column used as weight (None counts detonations)
+METRICS = {"count": None, "yield": "Explosion Yield L"}
+
+# Colour ramp from transparent dark purple (few events) to bright yellow (many events)
+COLOR_STOPS = np.array([[40, 10, 70, 120], [120, 28, 110, 180], [210, 60, 70, 220],
+                        [250, 140, 20, 240], [252, 255, 160, 255]], dtype=float)
+COLORMAP = np.stack([np.interp(np.linspace(0, 1, 256), np.linspace(0, 1, len(COLOR_STOPS)), COLOR_STOPS[:, channel])
+                     for channel in range(4)], axis=1).astype(np.uint8)
+
+
+def world_pixels(latitude, longitude, zoom):
+    """Web-mercator pixel coordinates (x to the east, y to the south) at a zoom level."""
+    world = TILE_SIZE * 2 ** zoom
+    latitude = np.radians(np.clip(latitude, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (longitude + 180) / 360 * world
+    y = (1 - np.log(np.tan(latitude) + 1 / np.cos(latitude)) / np.pi) / 2 * world
+    return (np.clip(x.astype(np.int64), 0, world - 1),
+            np.clip(y.astype(np.int64), 0, world - 1))
+
+
+def density_grid(latitude, longitude, weights, zoom):
+    """Sum of the weights in every pixel of the world at a zoom level, as a (rows, columns) array."""
+    world = TILE_SIZE * 2 ** zoom
+    x, y = world_pixels(latitude, longitude, zoom)
+    return np.bincount(y * world + x, weights=weights, minlength=world * world).reshape(world, world)
+
+
+def colorize(grid, vmax):
+    """RGBA image of a grid on a log scale; empty pixels are transparent."""
+    scaled = np.log1p(grid) / np.log1p(vmax) if vmax > 0 else np.zeros_like(grid)
+    image = COLORMAP[np.clip(scaled * 255, 0, 255).astype(np.uint8)]
+    image[grid <= 0] = 0
+    return image
+
+
+def tile_bounds(x, y, zoom):
+    """[west, south, east, north] of a tile in degrees."""
+    count = 2 ** zoom
+
+    def latitude(row):
+        return float(np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * row / count)))))
+
+    return [x / count * 360 - 180, latitude(y + 1), (x + 1) / count * 360 - 180, latitude(y)]
+
+
+def _save(image, path):
+    from PIL import Image  # Pillow comes with Streamlit
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Written aside and renamed, so readers never see half a tile
+    Image.fromarray(np.ascontiguousarray(image), "RGBA").save(temporary, format=TILE_FORMAT.upper(), optimize=True)
+    os.replace(temporary, path)
+
+
+def render_tiles(catalog, metric="count", zoom=1):
+    """Render (or read back from the cache) the non-empty tiles of one zoom level.
+
+    Returns a list of {"x", "y", "url", "bounds"} dicts, one per tile that has detonations. The URLs are
+    relative to the Streamlit server root, see tile_urls.
+    """
+    if metric not in METRICS or not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"unknown metric {metric!r} or zoom {zoom} (0 to {MAX_ZOOM})")
+    version = catalog.attrs["version"]
+    level = f"{version}/{metric}/{zoom}"
+    index_path = os.path.join(TILE_DIR, level, "index.json")
+
+    if os.path.exists(index_path):
+        with open(index_path) as file:
+            return json.load(file)
+
+    points = nd.derive("quality_masks", catalog)["Has Coordinates"].to_numpy()
+    latitude = catalog["Latitude"].to_numpy(dtype=float)[points]
+    longitude = catalog["Longitude"].to_numpy(dtype=float)[points]
+    weights = None
+    if METRICS[metric] is not None:
+        weights = np.nan_to_num(catalog[METRICS[metric]].to_numpy(dtype=float)[points])
+    grid = density_grid(latitude, longitude, weights, zoom)
+
+    # One colour scale for the whole level, so neighbouring tiles match
+    image = colorize(grid, grid.max())
+    tiles = []
+    count = 2 ** zoom
+    for y in range(count):
+        for x in range(count):
+            rows = slice(y * TILE_SIZE, (y + 1) * TILE_SIZE)
+            columns = slice(x * TILE_SIZE, (x + 1) * TILE_SIZE)
+            if not grid[rows, columns].any():
+                continue  # Empty tiles are not drawn at all
+            name = f"{x}/{y}.{TILE_FORMAT}"
+            _save(image[rows, columns], os.path.join(TILE_DIR, level, name))
+            tiles.append({"x": x, "y": y, "url": f"{TILE_URL}/{level}/{name}", "bounds": tile_bounds(x, y, zoom)})
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    temporary = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(tiles, file)
+    os.replace(temporary, index_path)
+    return tiles
+
+
+def tile_urls(tiles, base_url):
+    """The tiles with absolute URLs under base_url (the Streamlit server root, e.g. "http://localhost:8501/").
+
+    pydeck only loads an image from an http(s) URL; any other string is read as a local file and inlined.
+    """
+    base_url = base_url if base_url.endswith("/") else base_url + "/"
+    return [{**tile, "url": urljoin(base_url, tile["url"])} for tile in tiles]
@@ -0,0 +1,942 @@
+"""Data layer of the Nuclear Explosions explorer.
+
+Loading, cleaning and the aggregates behind the tabs live here, without any Streamlit code,
+so the Streamlit app (Final_Project_AS.py) and the HTTP API (api.py) share the same logic and caches.
+"""
+
+import collections
+import concurrent.futures
+import functools
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nuclear_explosions.csv")
+
+# Rename the columns for the better understanding and readability [DA1]
+COLUMN_NAMES = {"WEAPON SOURCE COUNTRY": "Source Country",
+                "WEAPON DEPLOYMENT LOCATION": "Deployment Location",
+                "Location.Cordinates.Latitude": "Latitude",
+                "Location.Cordinates.Longitude": "Longitude",
+                "Location.Cordinates.Depth": "Depth",
+                "Data.Source": "Source",
+                "Data.Magnitude.Body": "Body Wave Magnitude",
+                "Data.Magnitude.Surface": "Surface Wave Magnitude",
+                "Data.Yeild.Lower": "Explosion Yield L",
+                "Data.Yeild.Upper": "Explosion Yield U",
+                "Data.Purpose": "Detonation Reason",
+                "Data.Name": "Name",
+                "Data.Type": "Detonation Method",
+                "Date.Day": "Day",
+                "Date.Month": "Month",
+                "Date.Year": "Year"}
+
+
+# Memory-lean storage
+# The repeated strings are stored as categories, the small integers in 8/16 bits, and the views only take the
+# columns they need (see project). Lean mode (NUCLEAR_LEAN_MEMORY=1) also stores the measurements as float32,
+# which halves them again at the cost of precision beyond ~7 digits.
+# The module does not change pandas options: with copy-on-write (always on from pandas 3, or enabled by the
+# application) copies are lazy, otherwise the derived data is copied for real (see derive).
+LEAN_MEMORY = os.environ.get("NUCLEAR_LEAN_MEMORY", "0") == "1"
+
+CATEGORY_COLUMNS = ["Source Country", "Deployment Location", "Source", "Detonation Reason", "Detonation Method"]
+INTEGER_COLUMNS = ["Day", "Month", "Year"]
+MEASUREMENT_COLUMNS = ["Latitude", "Longitude", "Depth", "Body Wave Magnitude", "Surface Wave Magnitude",
+                       "Explosion Yield L", "Explosion Yield U",
+                       "Estimated Yield", "Estimated Yield Low", "Estimated Yield High"]
+
+# Columns each view works on, so it does not carry the other columns around
+VIEW_COLUMNS = {
+    "map": ["Latitude", "Longitude", "Source Country"],
+    "yield_map": ["Latitude", "Longitude", "Yield Used"],
+}
+
+
+# Loading
+# The catalog is cached per process and per dataset version: the version is a hash of the file contents,
+# so editing the CSV gives a new version (and fresh derived data), while reruns reuse the loaded frame.
+#
+# Several catalog files (per country, per source, supplemental files...) can be merged into one catalog by
+# listing them in NUCLEAR_CATALOGS, separated like PATH entries; glob patterns are expanded. The files are
+# parsed in parallel processes, and an event listed in an earlier file is dropped from the later files
+# (first file wins). Events are matched on date, name and coordinates only, as sources disagree on yields
+# and spelling of the other columns. Rows of one file are never merged with each other: a file can list
+# several tests of the same day at the same site (salvos, often unnamed), and a single-file load returns
+# every row. A later file only adds the rows of a key beyond the number an earlier file already listed.
+CATALOGS_VARIABLE = "NUCLEAR_CATALOGS"
+DUPLICATE_KEY_DECIMALS = 2  # Coordinates are compared at ~1 km precision when looking for duplicates
+
+
+@functools.lru_cache(maxsize=16)
+def _hash_file(path, modified, size):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def catalog_paths(paths=None):
+    """Absolute paths of the catalog files: the given path(s), else NUCLEAR_CATALOGS, else DATA_PATH."""
+    if paths is None:
+        paths = [entry for entry in os.environ.get(CATALOGS_VARIABLE, "").split(os.pathsep) if entry] or [DATA_PATH]
+    elif isinstance(paths, str):
+        paths = [paths]
+    expanded = []
+    for path in paths:
+        for match in sorted(glob.glob(path)) if glob.has_magic(path) else [path]:
+            if os.path.abspath(match) not in expanded:
+                expanded.append(os.path.abspath(match))
+    if not expanded:
+        raise FileNotFoundError(f"no catalog file matches {paths}")
+    return tuple(expanded)
+
+
+def dataset_version(paths=None):
+    """Short content hash of the catalog file(s) (a file is only re-hashed when its size or modification time changes)."""
+    versions = []
+    for path in catalog_paths(paths):
+        stat = os.stat(path)
+        versions.append(_hash_file(path, stat.st_mtime_ns, stat.st_size))
+    if len(versions) == 1:
+        return versions[0]
+    return hashlib.sha1(" ".join(versions).encode()).hexdigest()[:16]
+
+
+def read_catalog_file(path):
+    """Parse and rename one catalog file; returns the frame and the seconds it took (runs in a worker process)."""
+    start = time.perf_counter()
+    frame = pd.read_csv(path)
+    frame.rename(columns=COLUMN_NAMES, inplace=True)
+    return frame, time.perf_counter() - start
+
+
+def read_catalogs(paths, max_workers=None):
+    """Parse the files in parallel and merge them, dropping the events already listed in an earlier file.
+
+    Returns the merged frame and a report with the rows, kept rows and parse time of every file.
+    """
+    if len(paths) == 1:
+        results = [read_catalog_file(paths[0])]  # Not worth starting a process pool
+    else:
+        # Spawned workers: forking from a thread of the Streamlit or ASGI server can deadlock
+        context = multiprocessing.get_context("spawn")
+        workers = max_workers or min(len(paths), os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+            results = list(pool.map(read_catalog_file, paths))
+
+    frames = [frame for frame, _ in results]
+    merged = pd.concat(frames, ignore_index=True)
+    file_index = np.repeat(np.arange(len(frames)), [len(frame) for frame in frames])
+
+    # Key (date, name, coordinates); groupby compares the key values, not only their hashes
+    name = merged["Name"].astype("string").str.strip().str.lower()
+    keys = merged[["Year", "Month", "Day"]].assign(
+        Name=name.mask(name.isin([text.lower() for text in MISSING_TEXT])),
+        Latitude=merged["Latitude"].round(DUPLICATE_KEY_DECIMALS),
+        Longitude=merged["Longitude"].round(DUPLICATE_KEY_DECIMALS))
+    key = keys.groupby(list(keys.columns), dropna=False, sort=False).ngroup().to_numpy()
+
+    # The n-th row of a key in a file is kept when no earlier file listed the key n times or more
+    counts = np.zeros((key.max() + 1 if len(key) else 0, len(frames)), dtype=np.int64)
+    np.add.at(counts, (key, file_index), 1)
+    listed_before = np.zeros_like(counts)
+    listed_before[:, 1:] = np.maximum.accumulate(counts, axis=1)[:, :-1]
+    occurrence = pd.Series(key).groupby([key, file_index]).cumcount().to_numpy()
+    keep = occurrence >= listed_before[key, file_index]
+    merged = merged[keep].reset_index(drop=True)
+
+    report = pd.DataFrame({"File": [os.path.basename(path) for path in paths],
+                           "Rows": [len(frame) for frame in frames],
+                           "Rows Kept": np.bincount(file_index[keep], minlength=len(frames)),
+                           "Parse Seconds": [round(seconds, 3) for _, seconds in results]})
+    return merged, report
+
+
+_catalogs = weakref.WeakValueDictionary()  # dataset version -> the loaded catalog, checked by derive
+
+
+@functools.lru_cache(maxsize=4)
+def _load_catalog(paths, version):
+    start = time.perf_counter()
+    frame, report = read_catalogs(paths)
+    frame, quality = validate(frame)
+    frame = frame.join(estimate_yields(frame))
+    frame["site_id"] = assign_sites(frame)
+    frame = downcast(frame)
+    frame.attrs["version"] = version
+    _catalogs[version] = frame
+    report.attrs["total_seconds"] = time.perf_counter() - start
+    return frame, report, quality
+
+
+def load_catalog(paths=None):
+    """Renamed catalog with the derived columns. The same frame is shared by every caller, so do not modify it."""
+    paths = catalog_paths(paths)
+    return _load_catalog(paths, dataset_version(paths))[0]
+
+
+def load_report(paths=None):
+    """Per-file report of the last load_catalog of these paths (rows, rows kept, parse seconds)."""
+    paths = catalog_paths(paths)
+    return _load_catalog(paths, dataset_version(paths))[1].copy()
+
+
+def quality_report(paths=None):
+    """Data-quality report of the catalog, made by validate when it was loaded."""
+    paths = catalog_paths(paths)
+    return _load_catalog(paths, dataset_version(paths))[2].copy()
+
+
+# Validation
+# One vectorized pass at load turns the catalog's sentinel values into real missing values:
+# a yield of 0 means "unknown", a magnitude of 0 means "not measured", and a name or reason "Nan" means none.
+# Coordinates outside the globe are cleared as well, and so is the (0, 0) placeholder some rows use for
+# "no coordinates" (there is no test site in the Gulf of Guinea). The date is built from Day/Month/Year.
+# Depth keeps its sign convention (positive below ground, negative = height above ground).
+SENTINEL_ZEROS = ["Explosion Yield L", "Explosion Yield U", "Body Wave Magnitude", "Surface Wave Magnitude"]
+MISSING_TEXT = ["Nan", "nan", ""]
+
+
+def validate(frame):
+    """Cleaned copy of a renamed catalog (sentinels as NaN, a Date column) and a report of what was flagged."""
+    columns = {}
+    checks = []
+
+    for column in SENTINEL_ZEROS:
+        sentinel = frame[column] == 0
+        columns[column] = frame[column].mask(sentinel)
+        checks.append((f"{column} is 0", int(sentinel.sum()), "set to missing"))
+
+    for column, limit in (("Latitude", 90), ("Longitude", 180)):
+        outside = frame[column].abs() > limit
+        columns[column] = frame[column].mask(outside)
+        checks.append((f"{column} outside -{limit} to {limit}", int(outside.sum()), "set to missing"))
+    placeholder = (frame["Latitude"] == 0) & (frame["Longitude"] == 0)
+    columns["Latitude"] = columns["Latitude"].mask(placeholder)
+    columns["Longitude"] = columns["Longitude"].mask(placeholder)
+    checks.append(("Coordinates are 0, 0 (placeholder)", int(placeholder.sum()), "set to missing"))
+    located = columns["Latitude"].notna() & columns["Longitude"].notna()
+    checks.append(("No coordinates", int((~located).sum()), "left out of the maps"))
+
+    for column in ("Name", "Detonation Reason"):
+        missing_text = frame[column].isin(MISSING_TEXT)
+        columns[column] = frame[column].mask(missing_text)
+        checks.append((f"{column} is \"Nan\"", int(missing_text.sum()), "set to missing"))
+
+    # to_datetime builds every date at once; impossible days or months (31 February, month 0...) become NaT
+    columns["Date"] = pd.to_datetime(frame[["Year", "Month", "Day"]].rename(columns=str.lower), errors="coerce")
+    checks.append(("Invalid date (Day/Month/Year)", int(columns["Date"].isna().sum()), "Date left empty"))
+
+    inverted = columns["Explosion Yield L"] > columns["Explosion Yield U"]
+    checks.append(("Yield lower estimate above the upper one", int(inverted.sum()), "flagged only"))
+
+    report = pd.DataFrame(checks, columns=["Check", "Rows", "Action"])
+    report["Share (%)"] = (100 * report["Rows"] / max(len(frame), 1)).round(1)
+    return frame.assign(**columns), report
+
+
+def downcast(frame, lean=None):
+    """Smaller dtypes for the catalog: categories for repeated strings, the smallest integer type for dates."""
+    lean = LEAN_MEMORY if lean is None else lean
+    columns = {column: frame[column].astype("category") for column in CATEGORY_COLUMNS if column in frame}
+    for column in INTEGER_COLUMNS:
+        if column in frame and frame[column].notna().all():
+            columns[column] = pd.to_numeric(frame[column], downcast="integer")
+    if lean:
+        for column in MEASUREMENT_COLUMNS:
+            if column in frame:
+                columns[column] = frame[column].astype("float32")
+    return frame.assign(**columns)
+
+
+def project(frame, view):
+    """Only the columns a view needs (a copy of those columns, or a lazy one with copy-on-write)."""
+    return frame[VIEW_COLUMNS[view]]
+
+
+def _copy_on_write():
+    """Whether pandas copies lazily: always from pandas 3, before only when the application enables it."""
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.get_option("mode.copy_on_write") is True
+
+
+def memory_report(frame, derived=None):
+    """Bytes per column of the catalog, then the total of every derived frame.
+
+    Derived frames that share their arrays with the catalog (copy-on-write) are counted at full size.
+    """
+    usage = frame.memory_usage(deep=True, index=False)
+    rows = [{"Frame": "catalog", "Column": column, "Bytes": int(size)} for column, size in usage.items()]
+    for name, derived_frame in (derived or {}).items():
+        rows.append({"Frame": name, "Column": "(all columns)",
+                     "Bytes": int(np.sum(derived_frame.memory_usage(deep=True)))})  # Series give a plain int
+    return pd.DataFrame(rows)
+
+
+def peak_rss_bytes():
+    """Peak resident memory of this process, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS reports bytes, Linux kilobytes
+
+
+# Yield estimation from seismic magnitudes
+# Many detonations have a body/surface wave magnitude but a yield of 0 (unknown), so the yield threshold in tab7 skips them.
+# The classic relation is log10(yield) = a + b * magnitude, fitted separately for every test site.
+YIELD_FIT_MIN_EVENTS = 5  # A site/country needs at least this many reported yields to get its own fit
+
+# 97.5% quantile of Student's t with 1 to 30 degrees of freedom, for the 95% prediction interval. A fit on n
+# events has n - 2 degrees of freedom; above 30 the Cornish-Fisher expansion around the normal is used.
+T_975 = np.array([12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                  2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                  2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042])
+Z_975 = 1.959964
+
+
+def t_quantile_975(degrees):
+    """97.5% quantile of Student's t for every number of degrees of freedom (NaN below 1)."""
+    degrees = np.asarray(degrees, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = Z_975
+        expansion = (z + (z ** 3 + z) / (4 * degrees)
+                     + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * degrees ** 2)
+                     + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * degrees ** 3))
+    table = T_975[np.clip(np.nan_to_num(degrees).astype(int), 1, len(T_975)) - 1]
+    return np.where(degrees < 1, np.nan, np.where(degrees <= len(T_975), table, expansion))
+
+
+def fit_by_group(groups, magnitude, log_yield, train):
+    """Least-squares fit of log10(yield) against magnitude for every group at once.
+
+    All groups are solved together from per-group sums (np.bincount), so there is no Python loop over groups.
+    Returns per-row arrays with the parameters of the row's group.
+    """
+    codes, uniques = pd.factorize(groups)
+    codes = np.where(codes < 0, len(uniques), codes)  # Rows with a missing group get their own bucket
+    n_groups = len(uniques) + 1
+
+    c, x, y = codes[train], magnitude[train], log_yield[train]
+    n = np.bincount(c, minlength=n_groups).astype(float)
+    sum_x = np.bincount(c, x, n_groups)
+    sum_y = np.bincount(c, y, n_groups)
+    sum_xx = np.bincount(c, x * x, n_groups)
+    sum_xy = np.bincount(c, x * y, n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = sum_x / n
+        sxx = sum_xx - sum_x * mean_x  # Centered sum of squares of the magnitudes
+        slope = (sum_xy - sum_x * sum_y / n) / sxx
+        intercept = (sum_y - slope * sum_x) / n
+        residuals = y - intercept[c] - slope[c] * x
+        sigma = np.sqrt(np.bincount(c, residuals ** 2, n_groups) / (n - 2))
+
+    valid = (n >= YIELD_FIT_MIN_EVENTS) & (sxx > 1e-9) & np.isfinite(sigma)
+    return {"intercept": intercept[codes], "slope": slope[codes], "sigma": sigma[codes],
+            "n": n[codes], "mean_x": mean_x[codes], "sxx": sxx[codes], "valid": valid[codes]}
+
+
+def estimate_yields(frame):
+    """Estimate yields (kilotons) with an uncertainty band from body/surface wave magnitudes."""
+    reported = frame["Explosion Yield L"].to_numpy(dtype=float)
+    has_yield = reported > 0
+    log_yield = np.log10(np.where(has_yield, reported, 1.0))
+
+    estimate = np.full(len(frame), np.nan)
+    low = np.full(len(frame), np.nan)
+    high = np.full(len(frame), np.nan)
+
+    # Coarse to fine: global fit, then per country, then per test site. A finer fit overwrites where it is valid
+    # and predicts with a narrower band (a small site fit with a large scatter does not replace its country's).
+    levels = [np.zeros(len(frame)), frame["Source Country"].to_numpy(), frame["Deployment Location"].to_numpy()]
+
+    # Surface wave first, so body wave magnitude (the more reliable one) wins when both are known
+    for column in ["Surface Wave Magnitude", "Body Wave Magnitude"]:
+        magnitude = frame[column].to_numpy(dtype=float)
+        has_magnitude = magnitude > 0
+        width = np.full(len(frame), np.inf)  # Band of the fit used so far for this magnitude
+        for groups in levels:
+            fit = fit_by_group(groups, magnitude, log_yield, has_yield & has_magnitude)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                # Prediction interval for a new event (residual spread plus uncertainty of the fitted line)
+                spread = t_quantile_975(fit["n"] - 2) * fit["sigma"] * np.sqrt(
+                    1 + 1 / fit["n"] + (magnitude - fit["mean_x"]) ** 2 / fit["sxx"])
+                use = fit["valid"] & has_magnitude & (spread < width)
+                center = (fit["intercept"] + fit["slope"] * magnitude)[use]
+            width[use] = spread[use]
+            spread = spread[use]
+            estimate[use] = 10 ** center
+            low[use] = 10 ** (center - spread)
+            high[use] = 10 ** (center + spread)
+
+    return pd.DataFrame({"Estimated Yield": estimate,
+                         "Estimated Yield Low": low,
+                         "Estimated Yield High": high}, index=frame.index)
+
+
+# Export of filtered rows
+# Every format is written as a generator of byte chunks, so a large selection never sits in memory as one big string.
+EXPORT_CHUNK_ROWS = 500  # Rows encoded per chunk
+EXPORT_FORMATS = {"CSV": ("csv", "text/csv"),
+                  "Parquet": ("parquet", "application/vnd.apache.parquet"),
+                  "GeoJSON": ("geojson", "application/geo+json")}
+
+
+def iter_csv(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the frame as CSV bytes, one chunk of rows at a time (header in the first chunk)."""
+    if frame.empty:
+        yield frame.to_csv(index=False).encode("utf-8")
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0)).encode("utf-8")
+
+
+def iter_geojson(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the frame as a GeoJSON FeatureCollection of points, one chunk of features at a time."""
+    properties = [column for column in frame.columns if column not in ("Latitude", "Longitude")]
+    yield b'{"type": "FeatureCollection", "features": ['
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        records = json.loads(chunk[properties].to_json(orient="records", date_format="iso"))  # NaN becomes null
+        features = []
+        for lat, lon, record in zip(chunk["Latitude"].tolist(), chunk["Longitude"].tolist(), records):
+            geometry = None if pd.isna(lat) or pd.isna(lon) else {"type": "Point",
+                                                                  "coordinates": [round(lon, 6), round(lat, 6)]}
+            features.append(json.dumps({"type": "Feature", "geometry": geometry, "properties": record}))
+        yield ((", " if start else "") + ", ".join(features)).encode("utf-8")
+    yield b"]}"
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain (keeps tell() for pyarrow)."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_parquet(frame, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield the frame as Parquet bytes, writing one row group per chunk."""
+    import pyarrow as pa  # pyarrow comes with Streamlit, but is only needed for this format
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()  # Footer
+
+
+EXPORT_WRITERS = {"CSV": iter_csv, "Parquet": iter_parquet, "GeoJSON": iter_geojson}
+
+
+def export_bytes(frame, name):
+    """The whole file in one bytes object, for callers that hold it in memory anyway (st.download_button).
+
+    Streaming callers (the API) use EXPORT_WRITERS instead.
+    """
+    if name == "CSV":
+        return frame.to_csv(index=False).encode("utf-8")
+    if name == "Parquet":
+        return frame.to_parquet(index=False)
+    return b"".join(iter_geojson(frame, chunk_rows=max(len(frame), 1)))
+
+
+# Derived data
+# Named, memoized derivations of the catalog that form a small dependency graph (a derivation lists the
+# derivations it is computed from). Each one is computed at most once per dataset version, does not depend
+# on any widget, and is handed out as a copy (a lazy one with copy-on-write), so a view modifying its copy
+# changes nothing for the other views, sessions or API requests.
+
+DERIVATIONS = {}  # name -> (function, names of the derivations it depends on)
+KEPT_VERSIONS = 2  # Derived data of older dataset versions is dropped
+
+_derived = collections.OrderedDict()  # dataset version -> {name: value}
+_derived_lock = threading.RLock()  # Streamlit sessions and API requests run in threads
+
+
+def derivation(name, *depends_on):
+    """Register the decorated function as the derivation called name.
+
+    The function receives the catalog followed by the values of the depends_on derivations.
+    """
+    def register(function):
+        DERIVATIONS[name] = (function, depends_on)
+        return function
+    return register
+
+
+def derive(name, catalog):
+    """Value of a registered derivation for the catalog returned by load_catalog.
+
+    Raises ValueError for any other frame: subsets and copies carry the catalog's attrs (and so its version),
+    but the cached value describes the whole catalog.
+    """
+    version = catalog.attrs.get("version")
+    if _catalogs.get(version) is not catalog:
+        raise ValueError(f"derive({name!r}) needs the catalog returned by load_catalog, not a subset or a copy")
+    with _derived_lock:
+        values = _derived.setdefault(version, {})
+        _derived.move_to_end(version)
+        while len(_derived) > KEPT_VERSIONS:
+            _derived.popitem(last=False)
+
+        if name not in values:
+            function, depends_on = DERIVATIONS[name]
+            value = function(catalog, *[derive(dependency, catalog) for dependency in depends_on])
+            for array in value if isinstance(value, tuple) else [value]:
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+            values[name] = value
+
+    value = values[name]
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not _copy_on_write())  # The cached value is never modified
+    return value
+
+
+# Aggregates behind the tabs (and the HTTP API)
+
+def filter_by_years(frame, start, end):
+    """Rows detonated between the start and end year (both included)."""
+    # [DA4] Filter data by one condition, based on the selected range
+    return frame[(frame["Year"] >= start) & (frame["Year"] <= end)]
+
+
+@derivation("year_counts")
+def year_counts(frame):
+    """Number of detonations per year, sorted by year."""
+    return frame["Year"].value_counts().sort_index()
+
+
+@derivation("quality_masks")
+def quality_masks(frame):
+    """Validity masks of every detonation, computed once so that the views do not each run their own dropna."""
+    return pd.DataFrame({
+        "Has Coordinates": frame["Latitude"].notna() & frame["Longitude"].notna(),
+        "Has Country": frame["Source Country"].notna(),
+        "Has Yield": frame["Explosion Yield L"].notna(),
+        "Has Magnitude": frame["Body Wave Magnitude"].notna() | frame["Surface Wave Magnitude"].notna(),
+        "Valid Date": frame["Date"].notna(),
+        "Has Reason": frame["Detonation Reason"].notna(),
+    })
+
+
+@derivation("map_points", "quality_masks")
+def map_points(frame, masks):
+    """Coordinates and source country of the detonations that have all three."""
+    return project(frame, "map")[masks["Has Coordinates"] & masks["Has Country"]]
+
+
+SMALL_CONTRIBUTORS = ["china", "india", "pakist", "uk"]
+
+
+@derivation("country_shares", "map_points")
+def country_shares(frame, points):
+    """Detonations per source country (of the map points, as in tab4), small contributors as "Other Countries"."""
+    # [DA2] Group data by Source Country and count occurrences, to count total detonations
+    counts = points.groupby("Source Country", observed=True).size().reset_index(name="Detonation Count")
+
+    # [DA7] Normalize country names for consistent matching
+    counts["Source Country"] = counts["Source Country"].str.strip().str.lower()
+
+    # [DA9] Use a lambda function to combine smaller contributors into "Other Countries"
+    counts["Source Country"] = counts["Source Country"].apply(
+        lambda x: "Other Countries" if x in SMALL_CONTRIBUTORS else x
+    )
+
+    # Regroup to merge "Other Countries" counts
+    counts = counts.groupby("Source Country", as_index=False).sum()
+
+    # [DA3] Sort the results by Detonation Count in descending order
+    counts = counts.sort_values(by="Detonation Count", ascending=False)
+    counts["Share"] = counts["Detonation Count"] / counts["Detonation Count"].sum()
+    return counts
+
+
+@derivation("reason_counts")
+def reason_summary(frame):
+    """Number of detonations per reason, most common first."""
+    summary = frame.groupby("Detonation Reason", observed=True).size().reset_index(name="Count")
+    return summary.sort_values(by="Count", ascending=False)
+
+
+@derivation("significant_reasons", "reason_counts")
+def significant_reasons(frame, detonation_counts, min_count=10):
+    """Detonation reasons with at least min_count detonations, plus "Combat" even though it is rare."""
+    reasons = detonation_counts.loc[detonation_counts["Count"] >= min_count, "Detonation Reason"].tolist()
+    if "Combat" not in reasons:
+        reasons.append("Combat")  # Ensure "Combat" is there
+    return tuple(reasons)
+
+
+def filter_by_reasons(catalog, reasons):
+    """Rows of the catalog whose detonation reason is one of the given reasons."""
+    # [DA5] Filter data by multiple conditions using .isin(), rows without a reason are left out by the mask
+    return catalog[catalog["Detonation Reason"].isin(reasons) & derive("quality_masks", catalog)["Has Reason"]]
+
+
+def summarize_reasons(catalog, reasons):
+    """Detonations per reason for the given reasons, taken from the derived counts of the whole catalog."""
+    counts = derive("reason_counts", catalog)
+    return counts[counts["Detonation Reason"].isin(reasons)]
+
+
+def effective_yield(frame, use_estimates=False):
+    """Reported lower yield, or with use_estimates the estimated yield where no yield was reported."""
+    yields = frame["Explosion Yield L"]
+    if use_estimates:
+        yields = yields.where(yields > 0, frame["Estimated Yield"])
+    return yields
+
+
+def high_yield(frame, threshold, use_estimates=False):
+    """Rows with a yield above the threshold (kilotons). The yield compared is added as "Yield Used".
+
+    With use_estimates, detonations without a reported yield are compared on their estimated yield.
+    """
+    yields = effective_yield(frame, use_estimates)
+    mask = yields > threshold
+    return frame[mask].assign(**{"Yield Used": yields[mask]})
+
+
+# Top-K selection
+# The catalog is sorted by yield once per dataset version. The detonations above any threshold are then
+# a prefix of that order: their exact count is one binary search, and the K largest are the first K
+# positions, so the work per rerun no longer grows with the number of detonations above the threshold.
+
+@derivation("yield_order")
+def yield_order(frame, use_estimates=False):
+    """Row positions sorted by yield, largest first and detonations without a yield last, with the yields."""
+    yields = effective_yield(frame, use_estimates).to_numpy(dtype=float)
+    order = np.argsort(-np.nan_to_num(yields, nan=-np.inf), kind="stable")
+    return pd.DataFrame({"Position": order, "Yield": yields[order]})
+
+
+derivation("yield_order_estimated")(functools.partial(yield_order, use_estimates=True))
+
+
+def _above(catalog, threshold, use_estimates):
+    """Part of the yield order above the threshold (a prefix of it)."""
+    ranking = derive("yield_order_estimated" if use_estimates else "yield_order", catalog)
+    total = int(np.searchsorted(-ranking["Yield"].to_numpy(), -threshold, side="left"))  # Yields > threshold
+    return ranking.iloc[:total]
+
+
+def top_yields(catalog, threshold, k, use_estimates=False):
+    """The k largest-yield detonations above the threshold, and how many there are in total.
+
+    Rows come largest first, with the yield compared added as "Yield Used" (see high_yield).
+    """
+    above = _above(catalog, threshold, use_estimates)
+    top = above.iloc[:k]
+    return catalog.iloc[top["Position"].to_numpy()].assign(**{"Yield Used": top["Yield"].to_numpy()}), len(above)
+
+
+# Map sampling
+# The map draws at most n of the located detonations above the threshold, sampled per source country in
+# proportion to its share. Per dataset version, the located detonations are grouped by country, each group
+# in yield order, with a random start offset per country. Those above a threshold are then a prefix of every
+# group (one binary search), and the sample takes quota evenly spaced positions of each prefix from its
+# offset, so a rerun costs O(n) however many detonations are above the threshold.
+SAMPLE_COLUMN = "Source Country"
+
+YieldStrata = collections.namedtuple("YieldStrata", ["positions", "yields", "keys", "starts", "offsets"])
+
+
+@derivation("yield_strata", "yield_order", "quality_masks")
+def yield_strata(frame, ranking, masks, seed=0):
+    """Located detonations grouped per SAMPLE_COLUMN value, each group in yield order.
+
+    positions and yields are the catalog row positions and yields, keys the group code times the catalog
+    length plus the rank in the yield order (sorted, for binary searches), starts the offset of every group
+    and offsets a random number in [0, 1) per group.
+    """
+    order = ranking["Position"].to_numpy()
+    located = masks["Has Coordinates"].to_numpy()[order]
+    ranks = np.flatnonzero(located)
+    codes = pd.factorize(frame[SAMPLE_COLUMN].to_numpy()[order[ranks]])[0] + 1  # Missing values form group 0
+    grouped = np.argsort(codes, kind="stable")  # Stable: yield order inside every group
+    sizes = np.bincount(codes, minlength=1)
+    return YieldStrata(positions=order[ranks[grouped]], yields=ranking["Yield"].to_numpy()[ranks[grouped]],
+                       keys=codes[grouped].astype(np.int64) * len(frame) + ranks[grouped],
+                       starts=np.concatenate([[0], np.cumsum(sizes)]),
+                       offsets=np.random.default_rng(seed).random(len(sizes)))
+
+
+derivation("yield_strata_estimated", "yield_order_estimated", "quality_masks")(yield_strata)
+
+
+def sample_yields(catalog, threshold, n, use_estimates=False):
+    """Map columns of at most about n located detonations above the threshold, and how many there are in total.
+
+    Every source country gets a share of the n points in proportion to its detonations (at least one each).
+    The sample is the same on every rerun with the same arguments, so the map does not jump.
+    """
+    strata = derive("yield_strata_estimated" if use_estimates else "yield_strata", catalog)
+    above = len(_above(catalog, threshold, use_estimates))  # Yield-order ranks below this are above the threshold
+    groups = np.arange(len(strata.starts) - 1)
+    ends = np.searchsorted(strata.keys, groups * len(catalog) + above)
+    sizes = ends - strata.starts[:-1]  # Located detonations above the threshold per group (a prefix of it)
+    total = int(sizes.sum())
+
+    quotas = sizes if total <= n else np.minimum(np.maximum(sizes * n // max(total, 1), sizes > 0), sizes)
+    group = np.repeat(groups, quotas)
+    step = np.arange(len(group)) - np.repeat(np.cumsum(quotas) - quotas, quotas)
+    # quota evenly spaced positions of the group's prefix, shifted by the group's random offset
+    index = strata.starts[group] + ((step + strata.offsets[group]) * sizes[group] // quotas[group]).astype(np.int64)
+    index = index[np.argsort(strata.keys[index] % len(catalog))]  # Largest yields first, as in the other views
+
+    rows = catalog[["Latitude", "Longitude", SAMPLE_COLUMN]].iloc[strata.positions[index]]
+    return rows.assign(**{"Yield Used": strata.yields[index]}), total
+
+
+# Test sites
+# Detonations are grouped into test sites with DBSCAN on the great-circle distance: two detonations closer
+# than SITE_RADIUS_KM are neighbours, and chains of neighbours between core points form a site. With
+# SITE_MIN_EVENTS = 1 every detonation is a core point, so a site is a single-link connected component of
+# the neighbour graph. Points are placed on the sphere in km and binned into a grid of cells small enough
+# that a whole cell is within the radius, so distances are only computed, in NumPy blocks, between nearby
+# cells. The site_id column is computed at load, so it is recomputed only when the dataset changes.
+EARTH_RADIUS_KM = 6371.0
+SITE_RADIUS_KM = 25
+SITE_MIN_EVENTS = 1  # Neighbours (itself included) that make a core point; above 1, isolated detonations get -1
+SITE_BLOCK = 1_000_000  # Distances computed at once when comparing the points of two cells
+
+
+def sphere_km(latitude, longitude):
+    """3D coordinates in km of points given in degrees, on a sphere of radius EARTH_RADIUS_KM."""
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    return EARTH_RADIUS_KM * np.column_stack([np.cos(latitude) * np.cos(longitude),
+                                              np.cos(latitude) * np.sin(longitude), np.sin(latitude)])
+
+
+def _count_within(points, others, limit):
+    """Number of others within the squared distance limit of every point."""
+    counts = np.zeros(len(points), dtype=np.int64)
+    step = max(1, SITE_BLOCK // max(len(others), 1))
+    for start in range(0, len(points), step):
+        distance = ((points[start:start + step, None, :] - others[None, :, :]) ** 2).sum(axis=2)
+        counts[start:start + step] = (distance <= limit).sum(axis=1)
+    return counts
+
+
+def _neighbour_cells(cells, reach):
+    """(a, b) index pairs, a < b, of the grid cells at most reach cells apart on every axis."""
+    low = cells.min(axis=0) - reach
+    span = cells.max(axis=0) + reach - low + 1
+
+    def key(cell):
+        cell = cell - low
+        return (cell[..., 0] * span[1] + cell[..., 1]) * span[2] + cell[..., 2]
+
+    keys = key(cells)
+    order = np.argsort(keys)
+    offsets = np.stack(np.meshgrid(*[np.arange(-reach, reach + 1)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+    targets = key(cells[:, None, :] + offsets[None, :, :]).ravel()
+    position = np.minimum(np.searchsorted(keys[order], targets), len(keys) - 1)
+    found = keys[order][position] == targets
+    a = np.repeat(np.arange(len(cells)), len(offsets))[found]
+    b = order[position[found]]
+    return a[a < b], b[a < b]
+
+
+def cluster_sites(latitude, longitude, radius_km=SITE_RADIUS_KM, min_events=SITE_MIN_EVENTS):
+    """DBSCAN labels (0, 1, ...) of the points, -1 for noise and for missing coordinates."""
+    labels = np.full(len(latitude), -1, dtype=np.int32)
+    located = np.flatnonzero(~(np.isnan(latitude) | np.isnan(longitude)))
+    if len(located) == 0:
+        return labels
+    points = sphere_km(latitude[located], longitude[located])
+    # Within radius_km along the surface <=> straight-line (chord) distance within this limit
+    limit = (2 * EARTH_RADIUS_KM * np.sin(radius_km / (2 * EARTH_RADIUS_KM))) ** 2
+
+    # Cells with a diagonal of one chord: points of the same cell are always neighbours
+    side = np.sqrt(limit / 3)
+    cells, cell_of = np.unique(np.floor(points / side).astype(np.int64), axis=0, return_inverse=True)
+    cell_of = cell_of.ravel()
+    order = np.argsort(cell_of, kind="stable")
+    bounds = np.searchsorted(cell_of[order], np.arange(len(cells) + 1))
+    members = [order[bounds[cell]:bounds[cell + 1]] for cell in range(len(cells))]
+    pairs = list(zip(*_neighbour_cells(cells, reach=2)))  # ceil(sqrt(3)) cells hold every neighbour
+
+    # Core points; only the points of cells with too few points need their neighbours counted
+    degree = np.bincount(cell_of)[cell_of]
+    if (degree < min_events).any():
+        for a, b in pairs:
+            for cell, other in ((a, b), (b, a)):
+                sparse = members[cell][degree[members[cell]] < min_events]
+                if len(sparse):
+                    degree[sparse] += _count_within(points[sparse], points[members[other]], limit)
+    core = degree >= min_events
+
+    # Sites: the core points of a cell are connected, so cells are joined (union-find) when two of their core
+    # points are neighbours
+    parent = np.arange(len(cells))
+
+    def root(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    cores = [members[cell][core[members[cell]]] for cell in range(len(cells))]
+    for a, b in pairs:
+        root_a, root_b = root(a), root(b)
+        if root_a != root_b and len(cores[a]) and len(cores[b]) \
+                and _count_within(points[cores[a]], points[cores[b]], limit).any():
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    cell_site = np.array([root(cell) for cell in range(len(cells))])
+
+    # Border points join the site of a core neighbour, in their own cell first
+    site_of = np.where(core, cell_site[cell_of], -1)
+    own = ~core & np.array([len(cell_cores) > 0 for cell_cores in cores])[cell_of]
+    site_of[own] = cell_site[cell_of[own]]
+    for a, b in pairs:
+        for cell, other in ((a, b), (b, a)):
+            border = members[cell][site_of[members[cell]] < 0]
+            if len(border) and len(cores[other]):
+                reached = _count_within(points[border], points[cores[other]], limit) > 0
+                site_of[border[reached]] = cell_site[other]
+
+    # Number the sites in the order of their first point
+    sited = site_of >= 0
+    sites, first, inverse = np.unique(site_of[sited], return_index=True, return_inverse=True)
+    rank = np.empty(len(sites), dtype=np.int32)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(sites), dtype=np.int32)
+    site_labels = np.full(len(located), -1, dtype=np.int32)
+    site_labels[sited] = rank[inverse.ravel()]
+    labels[located] = site_labels
+    return labels
+
+
+def assign_sites(frame):
+    """site_id of every detonation of the catalog."""
+    return cluster_sites(frame["Latitude"].to_numpy(dtype=float), frame["Longitude"].to_numpy(dtype=float))
+
+
+def _most_common(frame, column):
+    """Most frequent value of column in every site (ties go to the first in the catalog)."""
+    counts = frame.groupby(["site_id", column], observed=True, sort=False).size()
+    counts = counts.sort_values(ascending=False, kind="stable").reset_index()
+    return counts.drop_duplicates("site_id").set_index("site_id")[column]
+
+
+@derivation("site_summary")
+def site_summary(frame):
+    """One row per test site: location, detonation count, total yield, active years and dominant country."""
+    sited = frame[frame["site_id"] >= 0]
+    summary = sited.groupby("site_id").agg(**{
+        "Latitude": ("Latitude", "mean"),
+        "Longitude": ("Longitude", "mean"),
+        "Detonations": ("site_id", "size"),
+        "Yield Total": ("Explosion Yield L", "sum"),
+        "First Year": ("Year", "min"),
+        "Last Year": ("Year", "max"),
+    })
+    summary.insert(0, "Site", _most_common(sited, "Deployment Location"))
+    summary.insert(1, "Dominant Country", _most_common(sited, "Source Country"))
+    return summary.sort_values("Detonations", ascending=False).reset_index()
+
+
+# Trends
+# Counts and yield totals are laid out once as dense (year x country) matrices with every year of the
+# range, including years without detonations. Rolling windows, cumulative curves and treaty comparisons
+# are then single NumPy calls along the year axis instead of a groupby per chart.
+TREATIES = {1963: "Partial Test Ban Treaty", 1996: "Comprehensive Nuclear-Test-Ban Treaty"}
+
+YearCountryMatrix = collections.namedtuple("YearCountryMatrix", ["years", "countries", "counts", "yields"])
+
+
+@derivation("year_country_matrix")
+def year_country_matrix(frame):
+    """Detonations and total reported yield (kilotons) per year and source country."""
+    years = np.arange(int(frame["Year"].min()), int(frame["Year"].max()) + 1)
+    codes, countries = pd.factorize(frame["Source Country"].astype(object), sort=True)
+    known = codes >= 0
+    cells = (frame["Year"].to_numpy(dtype=int)[known] - years[0]) * len(countries) + codes[known]
+    size = len(years) * len(countries)
+
+    counts = np.bincount(cells, minlength=size).reshape(len(years), len(countries))
+    yields = np.nan_to_num(frame["Explosion Yield L"].to_numpy(dtype=float)[known])
+    totals = np.bincount(cells, weights=yields, minlength=size).reshape(len(years), len(countries))
+    return YearCountryMatrix(years, np.asarray(countries, dtype=object), counts, totals)
+
+
+def rolling_mean(matrix, window):
+    """Trailing window-year average of every column (the first years average the years available)."""
+    cumulative = np.cumsum(matrix, axis=0, dtype=float)
+    earlier = np.zeros_like(cumulative)
+    earlier[window:] = cumulative[:-window]
+    years_in_window = np.minimum(np.arange(1, len(matrix) + 1), window)[:, None]
+    return (cumulative - earlier) / years_in_window
+
+
+def treaty_comparison(matrix, window=5):
+    """Detonations and yield per year in the window years before and after every treaty, per country.
+
+    Only the years of the catalog are counted: a side is averaged over the years it actually covers (shown in
+    "Years Before"/"Years After"), and is empty when the catalog has none of its years.
+    """
+    def side(values, years):
+        """Covered years as "first-last" and the per-year average of every country, or empty without years."""
+        if not years.any():
+            return None, np.nan
+        covered = matrix.years[years]
+        return f"{covered[0]}-{covered[-1]}", values[years].sum(axis=0) / years.sum()
+
+    rows = []
+    for year, treaty in TREATIES.items():
+        before = (matrix.years >= year - window) & (matrix.years < year)
+        after = (matrix.years > year) & (matrix.years <= year + window)
+        for metric, values in (("Detonations", matrix.counts), ("Yield (kt)", matrix.yields)):
+            years_before, per_year_before = side(values, before)
+            years_after, per_year_after = side(values, after)
+            rows.append(pd.DataFrame({
+                "Treaty": f"{treaty} ({year})",
+                "Metric": metric,
+                "Source Country": matrix.countries,
+                "Years Before": years_before,
+                "Per Year Before": per_year_before,
+                "Years After": years_after,
+                "Per Year After": per_year_after,
+            }))
+    comparison = pd.concat(rows, ignore_index=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = 100 * (comparison["Per Year After"] / comparison["Per Year Before"] - 1)
+    comparison["Change (%)"] = change.replace([np.inf, -np.inf], np.nan).round(1)  # Empty when nothing before
+    return comparison
+
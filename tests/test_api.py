@@ -0,0 +1,93 @@
+"""Tests of the HTTP API, run in-process through httpx's ASGI transport (no server needed)."""
+
+import asyncio
+import os
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402  (after the path setup)
+
+
+def get(path, **headers):
+    async def request():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    return asyncio.run(request())
+
+
+def test_etag_and_not_modified():
+    response = get("/countries")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag == f'W/"{response.headers["x-dataset-version"]}"'
+
+    cached = get("/countries", **{"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_gzip():
+    response = get("/high-yield?threshold=0", **{"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) > 0  # httpx decompresses the body
+
+    small = get("/version", **{"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+def test_arrow():
+    import pyarrow as pa
+
+    rows = get("/high-yield?threshold=1000").json()
+    response = get("/high-yield?threshold=1000", Accept=api.ARROW_TYPE)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == api.ARROW_TYPE
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == len(rows)
+
+
+def test_invalid_query_never_gets_304():
+    etag = get("/version").headers["etag"]
+    for path in ["/high-yield?threshold=x", "/high-yield?limit=-1", "/countries?format=csv"]:
+        assert get(path, **{"If-None-Match": etag}).status_code == 400, path
+
+
+def test_limit():
+    assert len(get("/high-yield?threshold=0&limit=3").json()) == 3
+
+
+def test_bad_requests():
+    for path in ["/high-yield?limit=-1", "/high-yield?threshold=x", "/years?start=x",
+                 "/countries?format=csv"]:
+        response = get(path)
+        assert response.status_code == 400, path
+        assert "error" in response.json()
+
+
+def test_unknown_endpoint_and_method():
+    assert get("/nope").status_code == 404
+
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://test") as client:
+            return await client.post("/years")
+
+    assert asyncio.run(post()).status_code == 405
+
+
+def test_streamed_rows():
+    for path, rows in [("/years?start=1960&end=1962", 3), ("/reasons?reason=Combat", 1),
+                       ("/high-yield?threshold=1000", 1)]:
+        response = get(path + "&format=csv")
+        assert response.status_code == 200, path
+        assert response.headers["content-type"] == "text/csv"
+        assert "content-length" not in response.headers  # Sent chunk by chunk
+        assert len(response.text.splitlines()) > rows  # Header + detonations, not the per-year aggregate
+
+    years = get("/years?start=1960&end=1962").json()
+    streamed = get("/years?start=1960&end=1962&format=csv").text.splitlines()
+    assert len(streamed) - 1 == sum(row["Count"] for row in years)
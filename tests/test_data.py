@@ -0,0 +1,333 @@
+"""Tests of the data layer (nuclear_data.py) on small hand-made frames and on the shipped catalog."""
+
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nuclear_data as nd  # noqa: E402  (after the path setup)
+
+
+# Yield estimation
+
+def test_fit_by_group_matches_polyfit():
+    rng = np.random.default_rng(0)
+    groups = np.repeat(["a", "b", "c"], 20)
+    magnitude = rng.uniform(4, 7, len(groups))
+    log_yield = np.where(groups == "a", 1.0, -2.0) + 0.8 * magnitude + rng.normal(0, 0.1, len(groups))
+    train = rng.random(len(groups)) < 0.8
+
+    fit = nd.fit_by_group(groups, magnitude, log_yield, train)
+    for group in ["a", "b", "c"]:
+        rows = groups == group
+        slope, intercept = np.polyfit(magnitude[rows & train], log_yield[rows & train], 1)
+        assert np.allclose(fit["slope"][rows], slope)
+        assert np.allclose(fit["intercept"][rows], intercept)
+        assert fit["valid"][rows].all()
+
+
+def test_fit_by_group_needs_enough_events():
+    groups = np.array(["a"] * (nd.YIELD_FIT_MIN_EVENTS - 1) + ["b"] * nd.YIELD_FIT_MIN_EVENTS)
+    magnitude = np.arange(len(groups), dtype=float)
+    fit = nd.fit_by_group(groups, magnitude, 2 * magnitude + np.sin(magnitude), np.ones(len(groups), bool))
+    assert not fit["valid"][groups == "a"].any()
+    assert fit["valid"][groups == "b"].all()
+
+
+def test_t_quantile():
+    # Exact values of the 97.5% quantile of Student's t
+    exact = {1: 12.706, 3: 3.182, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+    assert np.allclose(nd.t_quantile_975(list(exact)), list(exact.values()), atol=1e-3)
+    assert np.isnan(nd.t_quantile_975([0])).all()
+
+
+def test_estimated_band_contains_estimate():
+    catalog = nd.load_catalog()
+    estimated = catalog["Estimated Yield"].notna()
+    assert estimated.any()
+    assert (catalog["Estimated Yield Low"][estimated] < catalog["Estimated Yield"][estimated]).all()
+    assert (catalog["Estimated Yield"][estimated] < catalog["Estimated Yield High"][estimated]).all()
+    # Only detonations with a magnitude get an estimate
+    has_magnitude = catalog["Body Wave Magnitude"].notna() | catalog["Surface Wave Magnitude"].notna()
+    assert not (estimated & ~has_magnitude).any()
+
+
+# Export
+
+def test_export_writers_match_pandas():
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    frame = nd.load_catalog().iloc[:1234]
+    csv = b"".join(nd.iter_csv(frame, chunk_rows=100))
+    assert csv == frame.to_csv(index=False).encode("utf-8")
+    assert nd.export_bytes(frame, "CSV") == csv
+
+    parquet = pq.read_table(io.BytesIO(b"".join(nd.iter_parquet(frame, chunk_rows=100))))
+    assert parquet.num_rows == len(frame)
+    assert parquet.equals(pa.Table.from_pandas(frame, preserve_index=False).cast(parquet.schema))
+
+    features = json.loads(b"".join(nd.iter_geojson(frame, chunk_rows=100)))["features"]
+    assert len(features) == len(frame)
+    located = frame["Latitude"].notna() & frame["Longitude"].notna()
+    assert sum(feature["geometry"] is not None for feature in features) == located.sum()
+    assert json.loads(nd.export_bytes(frame, "GeoJSON"))["features"] == features
+
+
+# Memory and derived data
+
+def test_import_leaves_pandas_options_alone():
+    import subprocess
+
+    code = ("import pandas as pd; before = pd.get_option('mode.copy_on_write'); import nuclear_data; "
+            "assert pd.get_option('mode.copy_on_write') == before")
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(nd.__file__), check=True)
+
+
+def test_derived_copies_are_independent():
+    catalog = nd.load_catalog()
+    points = nd.derive("map_points", catalog)
+    assert list(points.columns) == nd.VIEW_COLUMNS["map"]
+    points.iloc[0, 0] = 999
+    points["Extra"] = 1
+    again = nd.derive("map_points", catalog)
+    assert again.iloc[0, 0] != 999
+    assert "Extra" not in again.columns
+    assert catalog.loc[again.index[0], "Latitude"] != 999
+
+
+def test_derive_only_accepts_the_catalog():
+    catalog = nd.load_catalog()
+    nd.derive("year_counts", catalog)
+    for frame in [catalog[catalog["Year"] < 1960], catalog.copy(), catalog.head(10)]:
+        assert frame.attrs["version"] == catalog.attrs["version"]  # pandas carries attrs over
+        with pytest.raises(ValueError):
+            nd.derive("year_counts", frame)
+
+
+# Test sites
+
+def brute_force_dbscan(latitude, longitude, radius_km, min_events):
+    """Textbook DBSCAN on the haversine distance, labels numbered from the first core point."""
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    a = (np.sin((lat[:, None] - lat[None]) / 2) ** 2
+         + np.cos(lat[:, None]) * np.cos(lat[None]) * np.sin((lon[:, None] - lon[None]) / 2) ** 2)
+    with np.errstate(invalid="ignore"):
+        neighbours = 2 * nd.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1))) <= radius_km + 1e-9
+    core = neighbours.sum(axis=1) >= min_events
+    labels = np.full(len(lat), -1)
+    site = 0
+    for seed in np.flatnonzero(core):
+        if labels[seed] >= 0:
+            continue
+        labels[seed] = site
+        queue = [seed]
+        while queue:
+            for neighbour in np.flatnonzero(neighbours[queue.pop()]):
+                if labels[neighbour] < 0:
+                    labels[neighbour] = site
+                    if core[neighbour]:
+                        queue.append(neighbour)
+        site += 1
+    return labels, core
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cluster_sites_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = 300
+    centers = rng.uniform([-80, -180], [80, 180], size=(5, 2))
+    points = centers[rng.integers(0, len(centers), n)] + rng.normal(0, rng.uniform(0.05, 1), size=(n, 2))
+    latitude, longitude = np.clip(points[:, 0], -89.9, 89.9), (points[:, 1] + 180) % 360 - 180
+    latitude[rng.random(n) < 0.05] = np.nan
+    radius_km, min_events = rng.uniform(5, 80), seed % 4 + 1
+
+    labels = nd.cluster_sites(latitude, longitude, radius_km, min_events)
+    expected, core = brute_force_dbscan(latitude, longitude, radius_km, min_events)
+    assert np.array_equal(labels < 0, expected < 0)
+    # Same sites for the core points (a border point between two sites may join either)
+    pairs = set(zip(labels[core], expected[core]))
+    assert len(pairs) == len({label for label, _ in pairs}) == len({label for _, label in pairs})
+    if min_events == 1:
+        assert np.array_equal(labels, expected)
+
+
+def test_cluster_sites_without_coordinates():
+    assert (nd.cluster_sites(np.array([np.nan, 1.0]), np.array([1.0, np.nan])) == -1).all()
+
+
+def test_site_summary_counts_every_sited_detonation():
+    catalog = nd.load_catalog()
+    summary = nd.derive("site_summary", catalog)
+    assert summary["Detonations"].sum() == (catalog["site_id"] >= 0).sum()
+    assert summary["Detonations"].is_monotonic_decreasing
+
+
+# Loading several catalog files
+
+def write_variant(tmp_path, name, change=None):
+    """Copy of the shipped catalog, changed by change(frame) before it is written."""
+    frame = pd.read_csv(nd.DATA_PATH)
+    if change is not None:
+        frame = change(frame)
+    path = tmp_path / name
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def test_single_file_keeps_every_row():
+    merged, report = nd.read_catalogs([nd.DATA_PATH])
+    assert len(merged) == len(pd.read_csv(nd.DATA_PATH))
+    assert report["Rows Kept"].tolist() == report["Rows"].tolist()
+
+
+def test_merge_drops_events_of_earlier_files(tmp_path):
+    rows = len(pd.read_csv(nd.DATA_PATH))
+
+    def other_source(frame):
+        # Another source reports other yields and spells the method differently
+        return frame.assign(**{"Data.Yeild.Lower": frame["Data.Yeild.Lower"] * 1.1,
+                               "Data.Type": frame["Data.Type"].str.upper()})
+
+    merged, report = nd.read_catalogs([nd.DATA_PATH, write_variant(tmp_path, "other.csv", other_source)])
+    assert len(merged) == rows
+    assert report["Rows Kept"].tolist() == [rows, 0]
+
+
+def test_merge_counts_unnamed_salvos(tmp_path):
+    original = pd.read_csv(nd.DATA_PATH)
+    unnamed = original["Data.Name"].isin(nd.MISSING_TEXT)
+    # The later file lists one more unnamed test on the day of an existing one, and a new named event
+    extra = pd.concat([original[unnamed].iloc[:1], original[~unnamed].iloc[:1].assign(**{"Data.Name": "new"})])
+    path = write_variant(tmp_path, "more.csv", lambda frame: pd.concat([frame, extra]))
+
+    merged, report = nd.read_catalogs([nd.DATA_PATH, path])
+    assert report["Rows Kept"].tolist() == [len(original), 2]
+    assert len(merged) == len(original) + 2
+
+
+# Top-K selection and map sampling
+
+@pytest.mark.parametrize("use_estimates", [False, True])
+@pytest.mark.parametrize("threshold", [-1, 0, 10, 1000, 10 ** 6])
+def test_top_yields_matches_high_yield(threshold, use_estimates):
+    catalog = nd.load_catalog()
+    expected = nd.high_yield(catalog, threshold, use_estimates=use_estimates)
+    top, total = nd.top_yields(catalog, threshold, 25, use_estimates=use_estimates)
+    assert total == len(expected)
+    assert len(top) == min(25, total)
+    assert top["Yield Used"].is_monotonic_decreasing
+    assert top["Yield Used"].tolist() == sorted(expected["Yield Used"], reverse=True)[:25]
+    assert set(top.index) <= set(expected.index)
+
+
+@pytest.mark.parametrize("use_estimates", [False, True])
+@pytest.mark.parametrize("threshold", [-1, 0, 10, 1000, 10 ** 6])
+def test_sample_yields(threshold, use_estimates):
+    catalog = nd.load_catalog()
+    expected = nd.high_yield(catalog, threshold, use_estimates=use_estimates)
+    located = expected[expected["Latitude"].notna() & expected["Longitude"].notna()]
+
+    rows, total = nd.sample_yields(catalog, threshold, 100, use_estimates=use_estimates)
+    assert total == len(located)
+    assert len(rows) <= min(total, 100 + catalog["Source Country"].nunique())
+    assert rows.index.is_unique and set(rows.index) <= set(located.index)
+    assert rows["Yield Used"].tolist() == located.loc[rows.index, "Yield Used"].tolist()
+    # Every country above the threshold is on the map
+    assert set(rows["Source Country"].dropna()) == set(located["Source Country"].dropna())
+    again, _ = nd.sample_yields(catalog, threshold, 100, use_estimates=use_estimates)
+    assert again.index.tolist() == rows.index.tolist()  # Same sample on every rerun
+
+    everything, _ = nd.sample_yields(catalog, threshold, len(catalog), use_estimates=use_estimates)
+    assert len(everything) == total
+
+
+# Validation and quality masks
+
+def test_validate():
+    raw = pd.DataFrame({
+        "Name": ["a", "Nan", "c", "", "e"],
+        "Detonation Reason": ["Wr", "Nan", "Pne", "Wr", "Se"],
+        "Latitude": [37.0, 0.0, 95.0, 10.0, 0.0],
+        "Longitude": [-116.0, 0.0, 10.0, 200.0, 5.0],
+        "Year": [1960, 1961, 1962, 1963, 1964],
+        "Month": [1, 2, 2, 13, 5],
+        "Day": [1, 29, 28, 1, 5],
+        "Explosion Yield L": [0.0, 10.0, 5.0, 20.0, 1.0],
+        "Explosion Yield U": [1.0, 0.0, 2.0, 20.0, 1.0],
+        "Body Wave Magnitude": [0.0, 5.0, 0.0, 0.0, 4.0],
+        "Surface Wave Magnitude": [0.0, 0.0, 0.0, 0.0, 0.0],
+    })
+    clean, report = nd.validate(raw)
+    rows = dict(zip(report["Check"], report["Rows"]))
+
+    assert clean["Explosion Yield L"].isna().tolist() == [True, False, False, False, False]
+    assert rows["Surface Wave Magnitude is 0"] == 5
+    # (0, 0) is a placeholder, but a real 0 latitude or longitude is kept
+    assert rows["Coordinates are 0, 0 (placeholder)"] == 1
+    assert clean["Latitude"].isna().tolist() == [False, True, True, False, False]
+    assert clean["Longitude"].isna().tolist() == [False, True, False, True, False]
+    assert rows["No coordinates"] == 3
+    assert clean["Name"].isna().tolist() == [False, True, False, True, False]
+    assert clean["Detonation Reason"].isna().sum() == rows["Detonation Reason is \"Nan\""] == 1
+    # 29 February 1961 and month 13 do not exist
+    assert clean["Date"].isna().tolist() == [False, True, False, True, False]
+    assert rows["Yield lower estimate above the upper one"] == 1  # 5 > 2; 10 > missing is not counted
+    assert len(clean) == len(raw)  # Nothing is dropped
+
+
+def test_quality_masks_match_catalog():
+    catalog = nd.load_catalog()
+    masks = nd.derive("quality_masks", catalog)
+    assert masks.index.equals(catalog.index)
+    assert (masks["Has Coordinates"] == catalog["Latitude"].notna() & catalog["Longitude"].notna()).all()
+    assert not ((catalog["Latitude"] == 0) & (catalog["Longitude"] == 0)).any()
+    assert (catalog.loc[~masks["Has Coordinates"], "site_id"] == -1).all()
+    points = nd.derive("map_points", catalog)
+    assert len(points) == (masks["Has Coordinates"] & masks["Has Country"]).sum()
+
+
+# Trends
+
+def test_rolling_mean_matches_pandas():
+    matrix = nd.derive("year_country_matrix", nd.load_catalog())
+    for window in [1, 3, 10]:
+        expected = pd.DataFrame(matrix.counts).rolling(window, min_periods=1).mean().to_numpy()
+        assert np.allclose(nd.rolling_mean(matrix.counts, window), expected)
+
+
+def test_year_country_matrix_counts_every_detonation():
+    catalog = nd.load_catalog()
+    matrix = nd.derive("year_country_matrix", catalog)
+    assert matrix.counts.sum() == catalog["Source Country"].notna().sum()
+    assert list(matrix.years) == list(range(int(catalog["Year"].min()), int(catalog["Year"].max()) + 1))
+    assert np.isclose(matrix.yields.sum(), catalog.loc[catalog["Source Country"].notna(), "Explosion Yield L"].sum())
+
+
+def test_treaty_comparison_only_counts_catalog_years():
+    years = np.arange(1990, 1999)  # The catalog ends in 1998
+    counts = np.zeros((len(years), 2))
+    counts[years == 1991, 0] = 4
+    counts[years == 1998, 1] = 2
+    matrix = nd.YearCountryMatrix(years, np.array(["A", "B"], dtype=object), counts, counts * 10)
+
+    comparison = nd.treaty_comparison(matrix, window=15)
+    ctbt = comparison[comparison["Treaty"].str.contains("1996") & (comparison["Metric"] == "Detonations")]
+    ctbt = ctbt.set_index("Source Country")
+    assert ctbt["Years Before"].tolist() == ["1990-1995"] * 2
+    assert ctbt["Per Year Before"].tolist() == [4 / 6, 0]
+    assert ctbt["Years After"].tolist() == ["1997-1998"] * 2
+    assert ctbt["Per Year After"].tolist() == [0, 2 / 2]  # Over the 2 years of the catalog, not 15
+    assert ctbt.loc["A", "Change (%)"] == -100
+    assert np.isnan(ctbt.loc["B", "Change (%)"])  # Nothing before
+
+    # 1963 is before the catalog starts: that side is empty, not zero
+    ptbt = comparison[comparison["Treaty"].str.contains("1963")]
+    assert ptbt["Years Before"].isna().all() and ptbt["Per Year Before"].isna().all()
+    assert ptbt["Change (%)"].isna().all()